@@ -1,30 +1,50 @@
 import time
+import io
+import os
+import json
+import math
+import functools
+from contextlib import contextmanager
+import hashlib
+from collections import OrderedDict
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit_js_eval import streamlit_js_eval
 import pandas as pd
-import plotly.express as px
-import pydeck as pdk
-import time
 import numpy as np
-import locale
+import datario
+from datario import (FILE_FORMATS, compact_dtypes, read_data_file, encode_data,
+                     get_data_fingerprint,
+                     build_search_index, search_data, build_sort_rank,
+                     DatasetStore, SummaryIndex, DEFAULT_BACKEND,
+                     get_available_backends, create_backend, TaskPool, wait_any,
+                     DatasetCatalog, ExportCache, compare_cubes, format_number, format_numbers,
+                     validate_data)
+from datario import etl, figures
+from datario.figures import FigureCache
+from datario.catalog import CATALOG_DIR, is_owner
 
 ############## CONFIG ##############
 
-# Set locale for number formatting
-locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
+def configure_page():
+    # Called at the start of each rerun, not at import time,
+    # so the module can be imported without a Streamlit page
 
-# Set page config
-st.set_page_config(
-    page_title='Chegada de Turistas no Rio de Janeiro',
-    page_icon='🧳',
-    layout='wide',
-    initial_sidebar_state='auto'
-)
+    # Set page config
+    st.set_page_config(
+        page_title='Chegada de Turistas no Rio de Janeiro',
+        page_icon='🧳',
+        layout='wide',
+        initial_sidebar_state='auto'
+    )
 
 ############## SESSION STATE FUNCTIONS ##############
 
-if 'data' not in st.session_state:
-    st.session_state.data = None
+if 'dataset' not in st.session_state:
+    st.session_state.dataset = None
+
+if 'filter_cache' not in st.session_state:
+    st.session_state.filter_cache = OrderedDict()
 
 if 'current_view' not in st.session_state:
     st.session_state.current_view = 0
@@ -41,32 +61,209 @@ if 'styles' not in st.session_state:
     }
 
 
-############## UTIL FUNCTIONS ##############
+############## PROFILING FUNCTIONS ##############
+
+# Profiling is enabled with the DASHBOARD_PROFILE=1 environment variable or the ?profile=1 URL parameter.
+# Records are also appended to DASHBOARD_PROFILE_FILE as JSON lines, if set.
+PROFILE_HISTORY_SIZE = 1000
+
+
+def is_profiling_enabled():
+    return os.environ.get('DASHBOARD_PROFILE') == '1' or st.query_params.get('profile') == '1'
+
+
+def start_profile():
+    # Called at the start of each rerun
+    st.session_state.profile_enabled = is_profiling_enabled()
+    if not st.session_state.profile_enabled:
+        return
+    st.session_state.profile_rerun = st.session_state.get('profile_rerun', 0) + 1
+    st.session_state.profile_records = []
+    st.session_state.profile_cache = {'hits': 0, 'misses': 0}
+    st.session_state.profile_figures = get_figure_cache().stats()
+    if 'profile_history' not in st.session_state:
+        st.session_state.profile_history = []
+
+
+def add_profile_record(name, seconds, data=None, **fields):
+    record = {
+        'rerun': st.session_state.profile_rerun,
+        'timestamp': round(time.time(), 3),
+        'name': name,
+        'ms': round(seconds * 1000, 3)
+    }
+    if isinstance(data, pd.DataFrame):
+        record['rows'], record['columns'] = data.shape
+    record.update(fields)
+    st.session_state.profile_records.append(record)
+
+
+def count_cache_access(hit):
+    if st.session_state.get('profile_enabled'):
+        st.session_state.profile_cache['hits' if hit else 'misses'] += 1
 
-def format_number(number):
-    # Convert to number if necessary
-    if isinstance(number, str):
-        number = int(number)
-    return locale.format_string('%d', number, grouping=True)
+
+@contextmanager
+def profile_section(name, data=None):
+    if not st.session_state.get('profile_enabled'):
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_profile_record(name, time.perf_counter() - start, data)
+
+
+def profiled(function):
+    # Record the wall time of the function and the size of the DataFrame it received (or returned)
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not st.session_state.get('profile_enabled'):
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        data = next((arg for arg in args if isinstance(arg, pd.DataFrame)), result)
+        add_profile_record(function.__name__, time.perf_counter() - start, data)
+        return result
+    return wrapper
+
+
+def profile_task(name, task, data=None, **fields):
+    # Work done in a pool can't add records, it is timed by its task once it completes
+    if st.session_state.get('profile_enabled') and task.seconds is not None:
+        add_profile_record(name, task.seconds, data, **fields)
+
+
+def is_fragment_rerun():
+    ctx = get_script_run_ctx()
+    return ctx is not None and bool(ctx.fragment_ids_this_run)
+
+
+def profiled_fragment(function):
+    # A fragment rerun only runs the fragment, not the dashboard: its records are
+    # kept as a rerun of their own, started and finished around the fragment
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not is_fragment_rerun():
+            return function(*args, **kwargs)
+        start_profile()
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            finish_profile(time.perf_counter() - start, 'fragment', fragment=function.__name__)
+    return wrapper
+
+
+def finish_profile(seconds, name='dashboard', **fields):
+    # Called at the end of each rerun (or fragment rerun), adds the totals and the
+    # cache counters of the rerun
+    if not st.session_state.get('profile_enabled'):
+        return
+    add_profile_record(name, seconds, **fields)
+    add_profile_record('filter_cache', 0, **st.session_state.profile_cache)
+    figures_before = st.session_state.profile_figures
+    figures_after = get_figure_cache().stats()
+    add_profile_record('figure_cache', 0,
+                       hits=figures_after['hits'] - figures_before['hits'],
+                       misses=figures_after['misses'] - figures_before['misses'])
+
+    records = st.session_state.profile_records
+    history = st.session_state.profile_history
+    history.extend(records)
+    del history[:-PROFILE_HISTORY_SIZE]
+
+    profile_file = os.environ.get('DASHBOARD_PROFILE_FILE')
+    if profile_file:
+        with open(profile_file, 'a') as file:
+            file.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+
+def view_profile_panel():
+    if not st.session_state.get('profile_enabled'):
+        return
+    with st.sidebar.expander('⏱️ Perfil da Execução'):
+        st.dataframe(pd.DataFrame(st.session_state.profile_records),
+                     hide_index=True, use_container_width=True)
+        history = st.session_state.profile_history
+        st.download_button(
+            label='Exportar Histórico (JSON Lines)',
+            data='\n'.join(json.dumps(record, ensure_ascii=False) for record in history),
+            file_name='perfil_dashboard.jsonl',
+            mime='application/jsonl',
+            use_container_width=True
+        )
 
 
 ############## DATA FUNCTIONS ##############
 
+# Loading, validation, aggregation and export live in the datario engine,
+# the functions below only bind them to the session and the Streamlit caches
+
+@profiled
 @st.cache_data
 def get_csv_content(csv_file):
     df = pd.read_csv(csv_file)
     return df.to_csv(index=False)
 
 
+@st.cache_data
+def get_parquet_content(csv_file):
+    df = compact_dtypes(pd.read_csv(csv_file))
+    return encode_data(df, 'Parquet')
+
+
+def get_dataset():
+    return st.session_state.dataset
+
+
 def get_data():
-    return st.session_state.data
+    dataset = get_dataset()
+    return dataset.data if dataset is not None else None
+
+
+def get_data_key():
+    dataset = get_dataset()
+    return dataset.key if dataset is not None else None
+
+
+def set_dataset(dataset):
+    # Replacing the handle releases the dataset previously held by the session
+    st.session_state.dataset = dataset
+
+    # Results cached for the previous data are no longer valid
+    st.session_state.filter_cache.clear()
+
+
+# The load functions run in the load pool, where the Streamlit caches can't be used:
+# the store is resolved by the caller, in the script thread
+
+def acquire_data(store, data):
+    # The store validates the data and stores the labels as categories
+    return store.acquire(get_data_fingerprint(data), lambda: data)
+
 
+def load_workbook_data(store, workbook_file=etl.RAW_DATA_FILE, progress=None):
+    # Only the year sheets that changed since the last run are processed again
+    return acquire_data(store, etl.process_workbook(workbook_file, progress=progress))
 
-def set_data(data):
-    # Make sure Ano is a string
-    if data is not None and 'Ano' in data.columns:
-        data['Ano'] = data['Ano'].astype(str)
-    st.session_state.data = data
+
+def load_appended_data(store, dataset, content, file_name, progress=None):
+    # Only the rows of the new years are read and aggregated, they are merged into the
+    # structures already built for the dataset
+    file = io.BytesIO(content)
+    file.name = file_name
+    return store.append(dataset, read_data_file(file, progress=progress))
+
+
+def load_uploaded_data(store, content, file_name, progress=None):
+    # Identical uploads share the same dataset, so the file is only parsed
+    # if no other session already loaded it
+    key = hashlib.sha1(content).hexdigest()
+    file = io.BytesIO(content)
+    file.name = file_name
+    return store.acquire(key, lambda: read_data_file(file, progress=progress))
 
 
 def get_available_views():
@@ -87,7 +284,7 @@ def set_current_view(view):
 
 
 def get_available_explore_views():
-    return ['Explorador', 'Editor']
+    return ['Explorador', 'Editor', 'Comparar']
 
 
 def get_current_explore_view():
@@ -99,6 +296,275 @@ def get_current_explore_view_index():
     return get_available_explore_views().index(get_current_explore_view())
 
 
+############## BACKGROUND TASKS ##############
+
+# The figures are built in a thread pool shared by all sessions. Loads, catalog writes and the
+# structures precomputed for a dataset run in another pool, so a large upload never delays the
+# charts of the other sessions. While the script waits for a task it updates the page every
+# TASK_POLL_INTERVAL, so a change of a widget interrupts the wait and the task keeps running.
+TASK_POLL_INTERVAL = 0.1
+LOAD_WORKERS = 2
+
+
+@st.cache_resource
+def get_task_pool():
+    return TaskPool()
+
+
+@st.cache_resource
+def get_load_pool():
+    return TaskPool(LOAD_WORKERS, 'datario-load')
+
+
+def wait_for_task(task, progress=None):
+    # Returns the result of the task as soon as it completes
+    while not task.wait(TASK_POLL_INTERVAL):
+        if progress is not None:
+            progress(task.progress)
+    return task.result()
+
+
+def start_precompute(dataset):
+    # Build what the Explorador and Editor need while the user is still on the upload view
+    load_pool = get_load_pool()
+    figure_cache = get_figure_cache()
+    load_pool.submit(lambda task: get_search_index(dataset), key=('search_index', dataset.key))
+    load_pool.submit(lambda task: get_query_backend(dataset), key=('query', dataset.key))
+    get_task_pool().submit(lambda task: figures.precompute_figures(
+        figure_cache, dataset.cube, get_chart_data(dataset), (dataset.key, UNFILTERED)),
+        key=('figures', dataset.key))
+
+
+def get_chart_data(dataset=None):
+    # Data of the charts of the unfiltered cube, extended instead of rebuilt when years are appended
+    dataset = dataset or get_dataset()
+    return dataset.get_derived('chart_data', lambda: figures.build_chart_data(dataset.cube))
+
+
+############## SHARED DATASET STORE ##############
+
+@st.cache_resource
+def get_dataset_store():
+    return DatasetStore()
+
+
+############## DATASET CATALOG ##############
+
+# The catalog is saved to data/02_processed/catalog, or to the DASHBOARD_CATALOG_DIR environment variable if set.
+# The datasets loaded by a user are only listed for them: behind a proxy authenticating the users,
+# DASHBOARD_USER_HEADER names the header with the user name, otherwise the user is the browser session.
+
+@st.cache_resource
+def get_dataset_catalog():
+    return DatasetCatalog(os.environ.get('DASHBOARD_CATALOG_DIR', CATALOG_DIR))
+
+
+def get_catalog_owner():
+    header = os.environ.get('DASHBOARD_USER_HEADER')
+    user = st.context.headers.get(header) if header else None
+    if user:
+        return f'user:{user}'
+    ctx = get_script_run_ctx()
+    return f'session:{ctx.session_id}' if ctx is not None else None
+
+
+def get_dataset_label(entry):
+    created = entry['created'].replace('T', ' ')
+    return f"{entry['name']} ({format_number(entry['rows'])} linhas, {created})"
+
+
+def open_saved_dataset(key):
+    # Datasets open in the process are shared, the others are memory-mapped from the catalog
+    # They were validated before being saved, their report and cube are saved with them
+    catalog = get_dataset_catalog()
+    return get_dataset_store().acquire(
+        key, lambda: catalog.open_dataset(key), validate=False,
+        load_cube=lambda: catalog.open_cube(key))
+
+
+def get_quality_report(dataset, catalog):
+    # Datasets saved without a report (before the validation existed) are validated once
+    return dataset.get_derived('quality_report', lambda: (
+        catalog.get_report(dataset.key) or validate_data(dataset.data)[1]))
+
+
+def save_to_catalog(dataset, name, source):
+    # Written in the load pool, the data of the dataset is read only. The DataRio
+    # workbook is public, the datasets loaded from it are shared by all users.
+    # Each owner has its own task, so a save running for another owner doesn't hide it.
+    catalog = get_dataset_catalog()
+    owner = get_catalog_owner() if source != 'workbook' else None
+    get_load_pool().submit(
+        lambda task: catalog.save_dataset(
+            dataset.key, dataset.data, name, source, get_quality_report(dataset, catalog),
+            owner, cube=dataset.cube),
+        key=('catalog', dataset.key, owner))
+
+
+############## QUERY BACKEND ##############
+
+# The filters and aggregations run on the backend set by the DASHBOARD_QUERY_BACKEND
+# environment variable (pandas, polars or duckdb). Backends not installed fall back to pandas.
+
+def get_query_backend_name():
+    name = os.environ.get('DASHBOARD_QUERY_BACKEND', DEFAULT_BACKEND)
+    return name if name in get_available_backends() else DEFAULT_BACKEND
+
+
+def get_query_backend(dataset=None):
+    # The backend is created once per dataset and shared by the sessions holding it
+    dataset = dataset or get_dataset()
+    name = get_query_backend_name()
+    return dataset.get_derived(
+        ('query', name), lambda: create_backend(name, dataset.data, dataset.cube))
+
+
+############## FILTER CACHE FUNCTIONS ##############
+
+# Results kept per session, the oldest are dropped over any of the limits. The size is
+# bounded so the memory of a session doesn't grow with the size of the dataset, and kept
+# small as every session has its own cache: hundreds of sessions hold at most a few GB.
+FILTER_CACHE_SIZE = 32
+FILTER_CACHE_BYTES = 8 * 1024 ** 2
+
+
+def get_result_size(result, shared=()):
+    # Approximate size in memory a cached result adds to the session: frames, arrays and
+    # the dicts and tuples holding them. The frames of the dataset (e.g. the unfiltered
+    # data) are shared by all the sessions, they don't count.
+    if any(result is frame for frame in shared):
+        return 0
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return int(result.memory_usage(index=False, deep=False).sum())
+    if isinstance(result, (pd.Index, np.ndarray)):
+        return result.nbytes
+    if isinstance(result, dict):
+        return sum(get_result_size(value, shared) for value in result.values())
+    if isinstance(result, (tuple, list)):
+        return sum(get_result_size(value, shared) for value in result)
+    return 0
+
+
+def get_cached_result(key, compute):
+    # Bounded LRU cache for the results of the filters applied to the current data,
+    # a result larger than the size limit is returned but not kept
+    cache = st.session_state.filter_cache
+    key = (get_data_key(),) + key
+    if key in cache:
+        count_cache_access(True)
+        cache.move_to_end(key)
+        return cache[key][0]
+
+    count_cache_access(False)
+    result = compute()
+    dataset = get_dataset()
+    size = get_result_size(result, (dataset.data, dataset.cube) if dataset is not None else ())
+    if size > FILTER_CACHE_BYTES:
+        return result
+    cache[key] = (result, size)
+    total = sum(size for _, size in cache.values())
+    while len(cache) > FILTER_CACHE_SIZE or total > FILTER_CACHE_BYTES:
+        _, (_, dropped) = cache.popitem(last=False)
+        total -= dropped
+    return result
+
+
+def get_filtered_data(continent='Todos', country='Todos', years=None):
+    years = tuple(years) if years is not None else None
+    return get_cached_result(
+        ('data', continent, country, years),
+        lambda: get_query_backend().filter_rows(continent, country, years))
+
+
+def get_filter_options(column, continent='Todos', country='Todos'):
+    # Options available for a filter, given the filters selected before it
+    def compute():
+        return datario.get_filter_options(get_filtered_data(continent, country), column)
+
+    return get_cached_result(('options', column, continent, country), compute)
+
+
+def get_summary_index():
+    # Built when the dataset is loaded, the metrics are answered from its partial sums
+    dataset = get_dataset()
+    return dataset.get_derived('summary_index', lambda: SummaryIndex(dataset.cube))
+
+
+def get_filtered_summary(continent='Todos', country='Todos', years=None):
+    # Aggregates shown in the Explorador view for the selected filters
+    years = tuple(years) if years is not None else None
+
+    def compute():
+        summary = get_summary_index().query(continent, country, years)
+        summary['cube'] = get_query_backend().filter_cube(continent, country, years)
+        return summary
+
+    return get_cached_result(('summary', continent, country, years), compute)
+
+
+############## SEARCH FUNCTIONS ##############
+
+def get_search_index(dataset=None):
+    dataset = dataset or get_dataset()
+    return dataset.get_derived('search_index', lambda: build_search_index(dataset.data))
+
+
+############## TABLE FUNCTIONS ##############
+
+TABLE_PAGE_SIZES = [25, 50, 100, 500]
+
+
+def get_sort_order(data, column, cache_key):
+    # Order of the rows of a filtered result, taken from the rank precomputed for the dataset
+    dataset = get_dataset()
+
+    def compute():
+        rank = dataset.get_derived(
+            ('sort_rank', column), lambda: build_sort_rank(dataset.data[column]))
+        return datario.get_sort_order(dataset.data, data, rank)
+
+    return get_cached_result(('sort', column) + cache_key, compute)
+
+
+def format_count_columns(data):
+    # Counts shown as 1.234.567, only for display: the rows are already sorted
+    # on the server, so the text columns are never sorted by the browser
+    return data.assign(**{
+        col: format_numbers(data[col]) for col in datario.COUNT_COLUMNS if col in data.columns})
+
+
+def view_paginated_table(data, key, cache_key):
+    # Only the visible page of the data is sent to the browser
+    total_rows = len(data)
+    col1, col2, col3, col4 = st.columns(4)
+    sort_column = col1.selectbox(
+        'Ordenar por', ['-'] + data.columns.tolist(), key=f'{key}_sort')
+    sort_order = col2.selectbox(
+        'Ordem', ['Crescente', 'Decrescente'], key=f'{key}_sort_order')
+    page_size = col3.selectbox(
+        'Linhas por página', TABLE_PAGE_SIZES, index=1, key=f'{key}_page_size')
+
+    # Go back to the first page if the data got smaller
+    pages = max(math.ceil(total_rows / page_size), 1)
+    if st.session_state.get(f'{key}_page', 1) > pages:
+        st.session_state[f'{key}_page'] = 1
+    page = col4.number_input('Página', min_value=1, max_value=pages,
+                             step=1, key=f'{key}_page')
+
+    start = (page - 1) * page_size
+    if sort_column != '-':
+        order = get_sort_order(data, sort_column, cache_key)
+        if sort_order == 'Decrescente':
+            order = order[::-1]
+        page_data = data.iloc[order[start:start + page_size]]
+    else:
+        page_data = data.iloc[start:start + page_size]
+
+    st.dataframe(format_count_columns(page_data), use_container_width=True)
+    st.caption(f'Mostrando {format_number(min(start + 1, total_rows))} a '
+               f'{format_number(start + len(page_data))} de {format_number(total_rows)} linhas')
+
+
 ############## CUSTOMIZATION FUNCTIONS ##############
 
 def apply_customizations():
@@ -152,144 +618,70 @@ def apply_customizations():
         """, unsafe_allow_html=True)
 
 
-############## PLOTS & GRAPHS ##############
+############## EXPORT CACHE ##############
 
-def plot_line_visitors_by_year(data, col=st):
-    # Group by year
-    data = data.groupby('Ano').sum().reset_index()
-
-    # Plot the total number of tourists by year
-    fig = px.line(data, x='Ano', y='Total', title='Total de Turistas por Ano',
-                  labels={'Ano': 'Ano', 'Total': 'Total de Turistas'},
-                  template='plotly_dark',
-                  markers=True
-                  )
-    col.plotly_chart(fig, use_container_width=True)
-
-
-def plot_bar_visitors_by_country(data, col=st):
-    # Group by country
-    data = data.groupby('País').sum().reset_index()
-
-    # Plot the total number of tourists by country
-    fig = px.bar(data, x='País', y='Total', title='Total de Turistas por País',
-                 labels={'País': 'País', 'Total': 'Total de Turistas'},
-                 template='plotly_dark',
-                 height=700
-                 )
-    st.plotly_chart(fig, use_container_width=True)
-
-
-def plot_area_visitors_by_year(data, col=st):
-    # Group by year and continent
-    data = data.groupby(['Ano', 'Continente']).sum().reset_index()
-
-    # Plot the total number of tourists by year and continent
-    fig = px.area(data, x='Ano', y='Total', color='Continente',
-                  title='Total de Turistas por Ano e Continente',
-                  labels={'Ano': 'Ano', 'Total': 'Total de Turistas'},
-                  template='plotly_dark',
-                  height=400
-                  )
-    col.plotly_chart(fig, use_container_width=True)
-
-
-def pie_chart_visitors_by_medium(data, col=st):
-    # Make a pie chart comparing the percentage of tourists by air and sea
-    total_air = data['Aérea'].sum()
-    total_sea = data['Marítima'].sum()
-    fig = px.pie(
-        names=['Aérea', 'Marítima'],
-        values=[total_air, total_sea],
-        labels={'value': 'Total de Turistas'},
-        title='Porcentagem de Turistas por Meio de Transporte'
-    )
-    col.plotly_chart(fig, use_container_width=True)
-
-
-def plot_3d_globe_with_tourists_by_country(data, col=st):
-    # Get coordinates for each country from the CSV file
-    csv_content = pd.read_csv('./data/02_processed/country_coordinates.csv')
-    df_lat_lon = pd.DataFrame(csv_content)
-    df_lat_lon = df_lat_lon.rename(columns={'Country': 'País'})
-
-    # Sum the number of tourists by country keeping only the columns we need
-    data = data.groupby('País').sum().reset_index()
-    data = data[['País', 'Aérea', 'Marítima']]
-
-    # Merge the data with the coordinates
-    data = pd.merge(data, df_lat_lon, on='País', how='left')
-
-    # Drop rows with missing values
-    data = data.dropna(subset=['Latitude', 'Longitude'])
-
-    # Add an offset for the "Marítima" bars to avoid overlap
-    data['Longitude_offset'] = data['Longitude'] + 2
-
-    # Add new columns as source for the height of the bars
-    # and normalize the values using a logarithmic scale
-    data['Aérea_Normalized'] = np.log1p(data['Aérea']) * 5
-    data['Marítima_Normalized'] = np.log1p(data['Marítima']) * 5
-
-    elevation_scale = 40000
-    elevation_range = [0, 40000]
-
-    # Create a ColumnLayer for the Aérea (Air) data
-    air_column_layer = pdk.Layer(
-        'ColumnLayer',
-        data,
-        get_position='[Longitude, Latitude]',
-        get_elevation='Aérea_Normalized',  # Column height based on air tourist data
-        elevation_scale=elevation_scale,
-        get_fill_color=[255, 0, 0],
-        elevation_range=elevation_range,
-        radius=100000,
-        pickable=True,
-        extruded=True,
-        auto_highlight=True
-    )
+@st.cache_resource
+def get_export_cache():
+    return ExportCache()
 
-    # Create a ColumnLayer for the Marítima (Sea) data with an offset
-    sea_column_layer = pdk.Layer(
-        'ColumnLayer',
-        data,
-        get_position='[Longitude_offset, Latitude]',
-        get_elevation='Marítima_Normalized',
-        elevation_scale=elevation_scale,
-        elevation_range=elevation_range,
-        get_fill_color=[0, 0, 255],
-        radius=100000,
-        pickable=True,
-        extruded=True,
-        auto_highlight=True
-    )
 
-    # Create the deck with an orbital view for a globe-like appearance
-    view_state = pdk.ViewState(
-        latitude=0,
-        longitude=0,
-        zoom=1,
-        pitch=45,
-        bearing=0
-    )
+############## FIGURE CACHE ##############
 
-    # Create the deck with the two column layers, text layer, and orbital view
-    r = pdk.Deck(
-        layers=[air_column_layer, sea_column_layer],
-        initial_view_state=view_state,
-        map_provider='mapbox',
-        map_style='mapbox://styles/mapbox/light-v9',
-        tooltip={"text": "{País}\n{Aérea} Aérea / {Marítima} Marítima"},
-    )
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
 
-    # Write the title with simulated legends
-    col.write("""
-              **Chegada de Turistas por País**   
-              Aérea (Vermelho) / Marítima (Azul)
-        """)
 
-    # Plot the 3D globe with the 3D bars and labels
-    col.pydeck_chart(r)
+############## PLOTS & GRAPHS ##############
+
+def draw_chart(chart, fig, container):
+    if chart == 'globe':
+        with container.container():
+            # Write the title with simulated legends
+            st.write("""
+                     **Chegada de Turistas por País**   
+                     Aérea (Vermelho) / Marítima (Azul)
+                """)
+
+            # Plot the 3D globe with the 3D bars and labels
+            st.pydeck_chart(fig)
+    else:
+        container.plotly_chart(fig, use_container_width=True)
+
+
+# Filters of the Explorador selecting all the data
+UNFILTERED = ('Todos', 'Todos', None)
+
+
+@profiled
+def view_charts(cube, charts, filters):
+    # Figures already built for the dataset and filters are drawn right away, the others
+    # are built in the task pool and each chart is drawn as soon as its figure is ready
+    pool = get_task_pool()
+    figure_cache = get_figure_cache()
+    alias = (get_data_key(), filters)
+    chart_data = None
+    pending = {}
+    for chart, col in charts:
+        fig = figure_cache.find((chart,) + alias)
+        if fig is not None:
+            draw_chart(chart, fig, col.empty())
+            continue
+        if chart_data is None and filters == UNFILTERED:
+            chart_data = get_chart_data()
+        task = pool.submit(
+            lambda task, chart=chart, chart_data=chart_data: figures.get_chart_figure(
+                figure_cache, chart, cube, chart_data, alias),
+            key=(chart,) + alias)
+        pending[task] = (chart, col.empty())
+
+    while pending:
+        for task in wait_any(pending, TASK_POLL_INTERVAL):
+            chart, placeholder = pending.pop(task)
+            draw_chart(chart, task.result(), placeholder)
+            profile_task('get_chart_figure', task, chart=chart)
+        for _, placeholder in pending.values():
+            placeholder.info('⏳ Gerando gráfico...')
 
 
 ############## VIEWS ##############
@@ -304,8 +696,11 @@ def view_download_processed_csv():
     with st.spinner('Carregando Dados...'):
         csv_content = get_csv_content(
             "./data/02_processed/total_continentes.csv")
+        parquet_content = get_parquet_content(
+            "./data/02_processed/total_continentes.csv")
 
-        st.download_button(
+        col1, col2 = st.columns(2)
+        col1.download_button(
             label="Download do CSV Normalizado",
             data=csv_content,
             file_name='total_continentes.csv',
@@ -314,6 +709,53 @@ def view_download_processed_csv():
             type='primary'
         )
 
+        # Parquet is smaller and faster to load
+        col2.download_button(
+            label="Download do Parquet Normalizado",
+            data=parquet_content,
+            file_name='total_continentes.parquet',
+            mime=FILE_FORMATS['Parquet'][1],
+            use_container_width=True
+        )
+
+
+def start_loading(source, name, work, kind='upload', key=None):
+    # One load per source (the workbook or an uploaded file), kept in the session so a
+    # rerun while the data is loading waits for the same task instead of loading it again.
+    # The kind (workbook, upload or append) is saved with the dataset in the catalog.
+    # Loads with a key are shared: a session loading the same key waits for the same task.
+    st.session_state.load_task = {
+        'source': source, 'name': name, 'kind': kind,
+        'task': get_load_pool().submit(work, key=key), 'done': False}
+
+
+def get_pending_load(source):
+    load_task = st.session_state.get('load_task')
+    if load_task is None or load_task['source'] != source or load_task['done']:
+        return None
+    return load_task
+
+
+@profiled
+def finish_loading(load_task, text):
+    # Wait for the data while showing the progress, then hand it to the session
+    progress_bar = st.progress(load_task['task'].progress, text=text)
+    try:
+        dataset = wait_for_task(
+            load_task['task'], lambda value: progress_bar.progress(value, text=text))
+    finally:
+        progress_bar.empty()
+    profile_task('load', load_task['task'], dataset.data, kind=load_task['kind'])
+
+    # The handle now belongs to the session, the task no longer holds it
+    load_task.update(task=None, done=True)
+    set_dataset(dataset)
+    start_precompute(dataset)
+
+    # Saved in the catalog, so it can be opened again without loading it
+    save_to_catalog(dataset, load_task['name'], load_task['kind'])
+    return dataset
+
 
 def view_data_upload():
     st.write('### Upload dos Dados')
@@ -322,33 +764,61 @@ def view_data_upload():
         st.success(
             '✅ Dados carregados com sucesso. Utilize o menu **Explorar** para explorar os dados.')
 
+        view_quality_report()
+        view_append_data()
+
         # Adiciona um botão para limpar os dados
         st.write("")
         st.write("")
         st.write('##### Limpar Dados')
         st.write('Clique no botão abaixo para limpar os dados carregados.')
         if st.button('Limpar Dados', use_container_width=True):
-            set_data(None)
+            set_dataset(None)
             set_current_view('Upload dos Dados')
             # Retorna para a tela de upload
-            with st.spinner('Atualizando...'):
-                # Aguarda 1 segundo
-                time.sleep(1)
-                st.rerun()
+            st.rerun()
         else:
             return get_data()
 
-    st.write('Faça o upload do arquivo com os dados CSV obtidos acima.')
+    st.write('Carregue os dados diretamente da planilha original do DataRio...')
+    if st.button('Carregar da Planilha do DataRio', use_container_width=True):
+        store = get_dataset_store()
+        start_loading('workbook', 'Planilha do DataRio', lambda task: load_workbook_data(
+            store, progress=task.set_progress), 'workbook', key=('workbook', etl.RAW_DATA_FILE))
+    load_task = get_pending_load('workbook')
+    if load_task is not None:
+        try:
+            finish_loading(load_task, 'Processando planilha...')
+        except Exception:
+            # Don't wait for the failed task again on the next rerun
+            del st.session_state.load_task
+            raise
+        st.rerun()
+
+    st.write('...ou faça o upload do arquivo com os dados CSV (ou Parquet) obtidos acima.')
+    extensions = [extension for extension, _ in FILE_FORMATS.values()]
     uploaded_file = st.file_uploader(
-        "Escolha um arquivo CSV", type=['csv'])
+        "Escolha um arquivo CSV ou Parquet", type=extensions)
     if uploaded_file is not None:
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
-            # Checa se o arquivo possui a estrutura correta
-            required_columns = ['País', 'Continente',
-                                'Aérea', 'Marítima', 'Total', 'Ano']
-            if all(col in df.columns for col in required_columns):
-                set_data(df)
+        if uploaded_file.name.endswith(tuple(extensions)):
+            load_task = st.session_state.get('load_task')
+            if load_task is None or load_task['source'] != uploaded_file.file_id:
+                store = get_dataset_store()
+                content, file_name = uploaded_file.getvalue(), uploaded_file.name
+                start_loading(uploaded_file.file_id, file_name, lambda task: load_uploaded_data(
+                    store, content, file_name, progress=task.set_progress))
+            load_task = get_pending_load(uploaded_file.file_id)
+            if load_task is None:
+                # The data of this file was loaded and then cleared
+                return
+
+            # Checa se o arquivo possui a estrutura correta durante a leitura
+            try:
+                dataset = finish_loading(load_task, 'Carregando arquivo...')
+            except ValueError as error:
+                st.error(f'❌ Por favor, faça o upload de um arquivo CSV válido. {error}')
+                return
+            if dataset is not None:
                 st.success(
                     '✅ Arquivo carregado com sucesso. Utilize o menu lateral para explorar os dados.')
                 st.rerun()
@@ -356,7 +826,89 @@ def view_data_upload():
         st.error('❌ Por favor, faça o upload de um arquivo CSV válido.')
 
 
+def view_quality_report():
+    # Report of the validation of the loaded data, computed once per dataset
+    report = get_quality_report(get_dataset(), get_dataset_catalog())
+    if report['removed']:
+        st.warning(f"⚠️ {format_number(report['removed'])} de {format_number(report['rows'])} "
+                   'linhas foram removidas por não passarem na validação.')
+    checks = report['checks']
+    checks = checks[checks['Linhas'] > 0]
+    with st.expander('Qualidade dos Dados'):
+        if checks.empty:
+            st.write('✅ Nenhum problema encontrado.')
+        else:
+            st.dataframe(checks.assign(Linhas=format_numbers(checks['Linhas'])),
+                         hide_index=True, use_container_width=True)
+
+
+def view_append_data():
+    st.write("")
+    st.write("")
+    st.write('##### Adicionar Novos Anos')
+    st.write('Quando o DataRio publicar um novo ano, faça o upload apenas dos dados desse ano '
+             'para adicioná-los aos dados carregados.')
+    extensions = [extension for extension, _ in FILE_FORMATS.values()]
+    appended_file = st.file_uploader(
+        'Escolha um arquivo CSV ou Parquet com os novos anos', type=extensions, key='append_file')
+    if appended_file is None:
+        return
+
+    # The same file is only appended once, even if it stays in the uploader
+    source = ('append', appended_file.file_id)
+    load_task = st.session_state.get('load_task')
+    if load_task is None or load_task['source'] != source:
+        store, dataset = get_dataset_store(), get_dataset()
+        content, file_name = appended_file.getvalue(), appended_file.name
+        start_loading(source, f'Dados + {file_name}', lambda task: load_appended_data(
+            store, dataset, content, file_name, progress=task.set_progress), 'append')
+    load_task = get_pending_load(source)
+    if load_task is None:
+        return
+
+    try:
+        finish_loading(load_task, 'Adicionando novos anos...')
+    except ValueError as error:
+        st.error(f'❌ Não foi possível adicionar os dados. {error}')
+        return
+    st.rerun()
+
+
+def view_dataset_catalog():
+    owner = get_catalog_owner()
+    entries = get_dataset_catalog().list_datasets(owner)
+    if not entries:
+        return
+
+    st.write("")
+    st.write('##### Conjuntos de Dados Salvos')
+    st.write('Os dados carregados ficam salvos e podem ser abertos novamente sem um novo upload.')
+    labels = {entry['key']: get_dataset_label(entry) for entry in entries}
+    keys = list(labels)
+    current_key = get_data_key()
+    key = st.selectbox('Conjunto de Dados', keys, format_func=labels.get,
+                       index=keys.index(current_key) if current_key in keys else 0)
+
+    col1, col2 = st.columns(2)
+    if col1.button('Abrir', use_container_width=True, disabled=key == current_key):
+        try:
+            dataset = open_saved_dataset(key)
+        except ValueError as error:
+            st.error(f'❌ {error}')
+            return
+        set_dataset(dataset)
+        start_precompute(dataset)
+        st.rerun()
+    # Only the datasets loaded by the user can be removed, the shared ones are
+    # removed by the limits of the catalog
+    if col2.button('Remover', use_container_width=True,
+                   disabled=not is_owner(entries[keys.index(key)], owner)):
+        get_dataset_catalog().remove_dataset(key, owner)
+        st.rerun()
+
+
 ### EXPLORE ###
+@profiled
 def view_explore():
     st.title('🔍 Explorar')
     st.write('Selecione uma opção para visualizar os dados.')
@@ -382,75 +934,62 @@ def view_explore():
         ##############################
 
         # Allow user to filter the displayed data
+        # Filtered data and options are cached, so switching back
+        # to a previous selection doesn't recompute them
         st.write('###### Filtros')
 
         # Make a selection for selecting the continent
         col1, col2, col3 = st.columns(3)
         continent = col1.selectbox(
-            'Continente', ['Todos'] + data['Continente'].unique().tolist())
-        if continent != 'Todos':
-            filtered_data = data[data['Continente'] == continent]
-        else:
-            filtered_data = data
+            'Continente', ['Todos'] + get_filter_options('Continente'))
 
         # Make a selection for selecting the country, should already be filtered by the continent
         # Sort by country name
         country = col2.selectbox(
-            'País', ['Todos'] + filtered_data.sort_values(by='País', ascending=True)['País'].unique().tolist())
-        if country != 'Todos':
-            filtered_data = filtered_data[filtered_data['País'] == country]
+            'País', ['Todos'] + get_filter_options('País', continent))
 
         # Make a selection for selecting the with a multiselect picker
         # Make all years selected by default
-        years = col3.multiselect(
-            'Ano', filtered_data['Ano'].unique().tolist(), default=filtered_data['Ano'].unique().tolist())
-        if years != filtered_data['Ano'].unique().tolist():
-            filtered_data = filtered_data[filtered_data['Ano'].isin(years)]
+        year_options = get_filter_options('Ano', continent, country)
+        years = col3.multiselect('Ano', year_options, default=year_options)
+        if years == year_options:
+            years = None
 
+        filters = (continent, country, tuple(years) if years is not None else None)
+        filtered_data = get_filtered_data(*filters)
         if filtered_data.empty:
             st.warning('⚠️ Nenhum dado encontrado com os filtros selecionados.')
             return
         else:
-            st.dataframe(filtered_data, use_container_width=True)
+            view_paginated_table(filtered_data, 'explore_table', ('data',) + filters)
+
+        # Charts and metrics below only read from the pre-aggregated cube
+        summary = get_filtered_summary(continent, country, years)
+        filtered_cube = summary['cube']
 
         ##############################
 
         # Show the total number of tourists
         col1, col2, col3 = st.columns(3)
-        total_tourists = format_number(filtered_data['Total'].sum())
+        total_tourists = format_number(summary['total'])
 
         col1.metric(label='Total',
                     value=total_tourists, delta="Turistas no total")
 
         # Show the countries with the most tourists including all years
-        most_tourists = filtered_data.groupby(
-            'País').sum().nlargest(5, 'Total')
+        most_tourists = summary['most_tourists']
         col2.metric(label='País com mais Turistas',
                     value=str(most_tourists.index[0]), delta=format_number(int(most_tourists['Total'].iloc[0])))
 
         # Show the average number of tourists per year
-        average_tourists = format_number(
-            filtered_data['Total'].sum() / len(filtered_data['Ano'].unique()))
+        average_tourists = format_number(summary['average'])
         col3.metric(label='Média',
                     value=average_tourists, delta="Turistas por ano")
 
         ##############################
 
-        # Plot the total number of tourists by country
-        plot_bar_visitors_by_country(filtered_data)
-
-        # Plot the total number of tourists by year
-        col1, col2 = st.columns(2)
-        plot_line_visitors_by_year(filtered_data, col1)
-
-        # Make a pie chart comparing the percentage of tourists by air and sea
-        pie_chart_visitors_by_medium(filtered_data, col2)
-
-        # Plot the total number of tourists by year and continent
-        plot_area_visitors_by_year(filtered_data)
-
-        # Plot 3D world map with tourists by country
-        plot_3d_globe_with_tourists_by_country(filtered_data)
+        # Only the selected chart section is computed
+        view_explore_charts(filtered_cube, filters)
     # Edit the data
     elif explore_option == 'Editor':
         ##############################
@@ -463,28 +1002,101 @@ def view_explore():
             'Colunas', data.columns.tolist(), default=get_data().columns.tolist())
         df = data[columns]
 
-        # Allow user to filter the displayed data with a search_filter box
-        search_filter = st.text_input('Filtrar Valores', '')
+        # Allow user to filter the displayed data with a search_filter box,
+        # optionally only in some of the displayed columns
+        col1, col2 = st.columns(2)
+        search_filter = col1.text_input('Filtrar Valores', '')
+        search_columns = col2.multiselect(
+            'Buscar nas Colunas', columns, placeholder='Todas as colunas')
+        table_key = ('columns', tuple(columns))
         if search_filter:
-            df = df[df.astype(str).apply(
-                lambda x: x.str.contains(search_filter, case=False, na=False)).any(axis=1)]
+            search_columns = search_columns or columns
+            table_key = ('search', tuple(columns),
+                         tuple(search_columns), search_filter)
+            with profile_section('editor_search'):
+                df = get_cached_result(
+                    table_key,
+                    lambda: df[search_data(data, get_search_index(), search_filter, search_columns)])
 
         # Show the data in a dataframe
-        st.dataframe(df, use_container_width=True)
+        view_paginated_table(df, 'editor_table', table_key)
 
         # Permite ao usuário download do arquivo CSV
         st.write('##### Download dos dados filtrados')
         st.write(
             'Clique no botão abaixo para fazer o download do arquivo CSV filtrado com base nas suas seleções.')
-        csv_content = df.to_csv(index=False)
+        file_format = st.radio('Formato', list(FILE_FORMATS), horizontal=True)
+        extension, mime = FILE_FORMATS[file_format]
+
+        # The file is only serialized again when the selections change, the files
+        # are kept in a cache shared by the sessions instead of the session state
+        content = get_export_cache().get(
+            (get_data_key(), file_format, tuple(columns), tuple(search_columns), search_filter),
+            df, file_format)
         st.download_button(
-            label="Download do CSV",
-            data=csv_content,
-            file_name='turistas_rio_de_janeiro.csv',
-            mime='text/csv',
+            label=f"Download do {file_format}",
+            data=content,
+            file_name=f'turistas_rio_de_janeiro.{extension}',
+            mime=mime,
             use_container_width=True,
             type='primary'
         )
+    # Compare the saved datasets
+    elif explore_option == 'Comparar':
+        ##############################
+
+        st.write('###### Comparar Conjuntos de Dados')
+        entries = get_dataset_catalog().list_datasets(get_catalog_owner())
+        if len(entries) < 2:
+            st.info('ℹ️ Carregue ao menos dois conjuntos de dados para compará-los.')
+            return
+
+        # The datasets are memory-mapped from the catalog, none of them is loaded again
+        labels = {entry['key']: get_dataset_label(entry) for entry in entries}
+        keys = st.multiselect('Conjuntos de Dados', list(labels),
+                              default=list(labels)[:2], format_func=labels.get)
+        if not keys:
+            return
+        try:
+            summary, by_year = get_cached_result(
+                ('compare',) + tuple(keys),
+                lambda: compare_cubes({labels[key]: open_saved_dataset(key).cube for key in keys}))
+        except ValueError as error:
+            st.error(f'❌ {error}')
+            return
+
+        st.dataframe(format_count_columns(summary), hide_index=True, use_container_width=True)
+        st.plotly_chart(figures.line_visitors_by_year_comparison(by_year),
+                        use_container_width=True)
+
+
+def get_available_chart_sections():
+    return ['Países', 'Anos', 'Continentes', 'Globo']
+
+
+@st.fragment
+@profiled_fragment
+def view_explore_charts(filtered_cube, filters):
+    # Switching between the sections only reruns this fragment,
+    # the filters, table and metrics above are not computed again
+    section = st.radio('Gráficos', get_available_chart_sections(),
+                       horizontal=True, key='current_chart_section')
+
+    if section == 'Países':
+        # Plot the total number of tourists by country
+        view_charts(filtered_cube, [('bar_visitors_by_country', st)], filters)
+    elif section == 'Anos':
+        # Plot the total number of tourists by year and
+        # make a pie chart comparing the percentage of tourists by air and sea
+        col1, col2 = st.columns(2)
+        view_charts(filtered_cube, [('line_visitors_by_year', col1),
+                                    ('pie_visitors_by_medium', col2)], filters)
+    elif section == 'Continentes':
+        # Plot the total number of tourists by year and continent
+        view_charts(filtered_cube, [('area_visitors_by_year', st)], filters)
+    elif section == 'Globo':
+        # Plot 3D world map with tourists by country
+        view_charts(filtered_cube, [('globe', st)], filters)
 
 
 ### CUSTOMIZE ###
@@ -538,9 +1150,11 @@ def view_customize():
     st.write('##### Resetar Sessão')
     st.write('Clique no botão abaixo para resetar sua sessão. Isso irá limpar os dados e as customizações!')
     if st.button('Resetar Sessão', use_container_width=True):
-        with st.spinner('Resetando...'):
-            time.sleep(2)
-            streamlit_js_eval(js_expressions="parent.window.location.reload()")
+        # The data and customizations are cleared right away,
+        # the page is reloaded as soon as the browser runs the script
+        st.session_state.clear()
+        streamlit_js_eval(js_expressions="parent.window.location.reload()")
+        st.stop()
 
     # Apply background and text colors dynamically
     st.session_state.styles['bg_color'] = bg_color
@@ -573,27 +1187,38 @@ def get_sidebar(view_index=0):
 
 
 def dashboard():
-    ### SIDEBAR ###
-    get_sidebar()
-
-    ### DATA UPLOAD ###
-    current_view = get_current_view()
-    if current_view == 'Upload dos Dados':
-        st.title('⬆️ Upload dos Dados')
-        view_download_processed_csv()
-        view_data_upload()
-    ### EXPLORE ###
-    elif current_view == 'Explorar':
-        view_explore()
-    ### CUSTOMIZE ###
-    elif current_view == 'Customizar':
-        view_customize()
-     ### ABOUT ###
-    elif current_view == 'Sobre':
-        view_about()
-
-    ### CUSTOMIZE COLORS ###
-    apply_customizations()
+    configure_page()
+    start_profile()
+    start = time.perf_counter()
+
+    # The records of a rerun interrupted by st.rerun (e.g. after a load) are kept too
+    try:
+        ### SIDEBAR ###
+        get_sidebar()
+
+        ### DATA UPLOAD ###
+        current_view = get_current_view()
+        if current_view == 'Upload dos Dados':
+            st.title('⬆️ Upload dos Dados')
+            view_download_processed_csv()
+            view_data_upload()
+            view_dataset_catalog()
+        ### EXPLORE ###
+        elif current_view == 'Explorar':
+            view_explore()
+        ### CUSTOMIZE ###
+        elif current_view == 'Customizar':
+            view_customize()
+         ### ABOUT ###
+        elif current_view == 'Sobre':
+            view_about()
+
+        ### CUSTOMIZE COLORS ###
+        apply_customizations()
+    finally:
+        ### PROFILING ###
+        finish_profile(time.perf_counter() - start, view=get_current_view())
+    view_profile_panel()
 
 
 if __name__ == '__main__':
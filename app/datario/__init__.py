@@ -0,0 +1,23 @@
+"""Headless engine of the dashboard: load, filter, aggregate, search and export the data.
+
+Nothing here imports Streamlit, so the same code runs in the app, in the notebook,
+in the benchmarks or in any other script. Plotly and pydeck are only imported by
+the figures and globe modules when a chart is built.
+"""
+from .schema import REQUIRED_COLUMNS, CATEGORY_COLUMNS, COUNT_COLUMNS, compact_dtypes
+from .load import (MAX_UPLOAD_BYTES, MAX_UPLOAD_ROWS, UPLOAD_CHUNK_ROWS,
+                   read_data_csv, read_data_parquet, read_data_file)
+from .export import FILE_FORMATS, encode_data, ExportCache
+from .aggregate import (CUBE_DIMENSIONS, CUBE_MEASURES, build_cube, rollup_cube,
+                        get_data_fingerprint, apply_filters, get_filter_options, summarize,
+                        compare_cubes)
+from .formatting import format_number, format_numbers
+from .search import fold_text, build_search_index, search_data, append_search_index
+from .table import build_sort_rank, get_sort_order
+from .append import append_rows, append_cube
+from .quality import validate_data, combine_reports
+from .summary import SummaryIndex
+from .store import DatasetHandle, DatasetStore
+from .catalog import DatasetCatalog
+from .tasks import Task, TaskPool, wait_any
+from .query import DEFAULT_BACKEND, get_available_backends, create_backend
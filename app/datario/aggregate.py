@@ -0,0 +1,81 @@
+"""Pre-aggregated cube of the dataset, filters and the summaries shown in the Explorador."""
+import hashlib
+import numpy as np
+import pandas as pd
+
+CUBE_DIMENSIONS = ['País', 'Continente', 'Ano']
+CUBE_MEASURES = ['Aérea', 'Marítima', 'Total']
+
+# Number of countries listed in the summary
+TOP_COUNTRIES = 5
+
+
+def build_cube(data):
+    # Sum the numeric columns for every País x Continente x Ano combination
+    # Counts may be stored as small ints, so they are summed as int64 to avoid overflows
+    measures = data[CUBE_MEASURES].astype('int64')
+    return measures.groupby([data[col] for col in CUBE_DIMENSIONS],
+                            observed=True).sum().reset_index()
+
+
+def rollup_cube(cube, by):
+    # Roll up the cube to the given dimensions, keeping only the numeric columns
+    return cube.groupby(by, observed=True)[CUBE_MEASURES].sum().reset_index()
+
+
+def get_data_fingerprint(data):
+    # Hash the content of the data, so identical data share the same fingerprint
+    if data is None:
+        return None
+    digest = hashlib.sha1(','.join(data.columns).encode())
+    digest.update(pd.util.hash_pandas_object(
+        data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def apply_filters(data, continent='Todos', country='Todos', years=None):
+    # Filter the data (or the cube) by continent, country and years
+    mask = np.ones(len(data), dtype=bool)
+    if continent != 'Todos':
+        mask &= (data['Continente'] == continent).to_numpy()
+    if country != 'Todos':
+        mask &= (data['País'] == country).to_numpy()
+    if years is not None:
+        mask &= data['Ano'].isin(years).to_numpy()
+    return data[mask] if not mask.all() else data
+
+
+def get_filter_options(data, column):
+    # Distinct values of a column, countries are sorted by name
+    values = data[column].unique()
+    if column == 'País':
+        return sorted(values.tolist())
+    return values.tolist()
+
+
+def summarize(cube):
+    # Total, countries with the most tourists and average per year of a (filtered) cube
+    total = cube['Total'].sum()
+    most_tourists = rollup_cube(
+        cube, 'País').set_index('País').nlargest(TOP_COUNTRIES, 'Total')
+    return {
+        'cube': cube,
+        'total': total,
+        'most_tourists': most_tourists,
+        'average': total / max(cube['Ano'].nunique(), 1)
+    }
+
+
+def compare_cubes(cubes):
+    # Totals of each dataset and their totals by year, for the cubes given by dataset name
+    summary = pd.DataFrame([{
+        'Conjunto': name,
+        'Países': cube['País'].nunique(),
+        'Anos': cube['Ano'].nunique(),
+        **cube[CUBE_MEASURES].sum().to_dict()
+    } for name, cube in cubes.items()])
+    by_year = pd.concat([
+        rollup_cube(cube, 'Ano').astype({'Ano': str}).assign(Conjunto=name)
+        for name, cube in cubes.items()
+    ], ignore_index=True).sort_values('Ano', kind='stable')
+    return summary, by_year
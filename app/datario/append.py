@@ -0,0 +1,66 @@
+"""Append mode: new years of data merged into a loaded dataset.
+
+Only the rows of the new years are aggregated. Their partitions are inserted into
+the cube and into the structures derived from it, so the rows already loaded are
+never grouped, hashed or folded again.
+"""
+import numpy as np
+import pandas as pd
+
+from .schema import CATEGORY_COLUMNS, compact_dtypes
+from .aggregate import CUBE_DIMENSIONS
+
+
+def append_rows(data, delta):
+    # Validate the new rows against the loaded data and merge them. The categories of the
+    # labels are extended with the new labels after the existing ones, so the codes of the
+    # loaded rows don't change. Returns the merged data and the new rows with the merged types.
+    if delta.empty:
+        raise ValueError('O arquivo não possui dados.')
+    missing_columns = [col for col in data.columns if col not in delta.columns]
+    if missing_columns:
+        raise ValueError(
+            f'Colunas ausentes no arquivo: {", ".join(missing_columns)}.')
+    delta = compact_dtypes(delta[data.columns].copy())
+
+    # Only years after the last loaded one are accepted: the new categories go after the
+    # loaded ones, so an older year would break the order of the years. A year already
+    # loaded must be uploaded again in full.
+    loaded_years = data['Ano'].cat.categories[data['Ano'].cat.codes.unique()]
+    last_year = max(loaded_years)
+    rejected_years = sorted(year for year in delta['Ano'].unique() if year <= last_year)
+    if rejected_years:
+        raise ValueError(
+            f'Os anos {", ".join(rejected_years)} não são posteriores ao último ano '
+            f'carregado ({last_year}). Só é possível adicionar anos novos.')
+
+    merged = {}
+    for col in CATEGORY_COLUMNS:
+        categories = data[col].cat.categories
+        new = delta[col].cat.categories.difference(categories, sort=False)
+        if len(new):
+            merged[col] = data[col].cat.add_categories(new)
+        delta[col] = delta[col].cat.set_categories(categories.append(new))
+    data = data.assign(**merged)
+    return pd.concat([data, delta], ignore_index=True), delta
+
+
+def append_cube(cube, delta_cube):
+    # Insert the cube of the new rows into the cube, in the order build_cube sorts the
+    # groups (by the codes of País, Continente and Ano). The categories of delta_cube are
+    # those of the merged data, an extension of the categories of the cube.
+    cube = cube.assign(**{
+        col: cube[col].cat.set_categories(delta_cube[col].cat.categories)
+        for col in CUBE_DIMENSIONS})
+    shape = [len(delta_cube[col].cat.categories) for col in CUBE_DIMENSIONS]
+    keys = np.ravel_multi_index(
+        [cube[col].cat.codes.to_numpy() for col in CUBE_DIMENSIONS], shape)
+    delta_keys = np.ravel_multi_index(
+        [delta_cube[col].cat.codes.to_numpy() for col in CUBE_DIMENSIONS], shape)
+
+    # Both are sorted, each row moves forward by the rows of the other one sorted before it
+    order = np.empty(len(cube) + len(delta_cube), dtype=np.intp)
+    order[np.arange(len(cube)) + np.searchsorted(delta_keys, keys)] = np.arange(len(cube))
+    order[np.arange(len(delta_cube)) + np.searchsorted(keys, delta_keys)] = (
+        np.arange(len(cube), len(order)))
+    return pd.concat([cube, delta_cube], ignore_index=True).take(order).reset_index(drop=True)
@@ -0,0 +1,205 @@
+"""Catalog of the loaded datasets, saved to disk as uncompressed Arrow IPC (Feather) files.
+
+The files are memory-mapped when a dataset is opened, so the counts are read without
+copying them and opening a large dataset doesn't parse it again. The cube of each dataset
+is saved next to its rows, so it is not aggregated again either.
+"""
+import os
+import json
+import threading
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+
+CATALOG_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', '02_processed', 'catalog')
+
+# Limits of the catalog, the oldest datasets are removed when a new one goes over them
+CATALOG_MAX_DATASETS = 50
+CATALOG_MAX_BYTES = 2 * 1024 ** 3
+CATALOG_MAX_OWNER_DATASETS = 10
+
+
+def is_owner(entry, owner):
+    # Datasets saved before the owners were recorded are shared
+    return owner in (entry.get('owners') or [])
+
+
+def is_visible(entry, owner):
+    return entry.get('owners') is None or owner in entry['owners']
+
+
+def write_table(path, table):
+    # Write to a temporary file first, so a dataset is never opened half written. Each
+    # thread has its own temporary file, the same dataset may be saved by two sessions.
+    temp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+    with pa.OSFile(temp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temp_path, path)
+
+
+class DatasetCatalog:
+    # Datasets identified by the same key as in the DatasetStore. The index of the
+    # catalog is a JSON file next to the Arrow files, rewritten on each change.
+    # Each dataset lists the owners that saved it and is only listed for them, datasets
+    # saved without an owner (e.g. the DataRio workbook) are shared by everyone.
+    def __init__(self, directory=CATALOG_DIR, max_datasets=CATALOG_MAX_DATASETS,
+                 max_bytes=CATALOG_MAX_BYTES, max_owner_datasets=CATALOG_MAX_OWNER_DATASETS):
+        self.directory = directory
+        self.max_datasets = max_datasets
+        self.max_bytes = max_bytes
+        self.max_owner_datasets = max_owner_datasets
+        self._lock = threading.Lock()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, f'{key}.arrow')
+
+    def get_cube_path(self, key):
+        return os.path.join(self.directory, f'{key}.cube.arrow')
+
+    def list_datasets(self, owner=None):
+        # Saved datasets visible to the owner (all of them without an owner), the most recent first
+        with self._lock:
+            entries = self._read_index()
+        if owner is not None:
+            entries = {key: entry for key, entry in entries.items() if is_visible(entry, owner)}
+        return sorted(entries.values(), key=lambda entry: entry['created'], reverse=True)
+
+    def save_dataset(self, key, data, name, source='upload', report=None, owner=None, cube=None):
+        # The entry of the dataset, None if the dataset is larger than the whole catalog
+        with self._lock:
+            entries = self._read_index()
+            if key in entries:
+                return self._add_owner(entries, key, owner)
+
+        tables = {self.get_path(key): pa.Table.from_pandas(data, preserve_index=False)}
+        if cube is not None:
+            tables[self.get_cube_path(key)] = pa.Table.from_pandas(cube, preserve_index=False)
+        if sum(table.nbytes for table in tables.values()) > self.max_bytes:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        for path, table in tables.items():
+            write_table(path, table)
+
+        entry = {
+            'key': key,
+            'name': name,
+            'source': source,
+            'rows': len(data),
+            'bytes': sum(os.path.getsize(path) for path in tables),
+            'owners': [owner] if owner is not None else None,
+            'created': datetime.now().isoformat(timespec='seconds')
+        }
+        if report is not None:
+            # The quality report of the data, so it is not validated again when opened
+            entry['quality'] = {**report, 'checks': report['checks'].to_dict('records')}
+        with self._lock:
+            entries = self._read_index()
+            if key in entries:
+                # Saved by another session in the meantime, the files hold the same data
+                return self._add_owner(entries, key, owner)
+            entries[key] = entry
+            self._evict(entries, key, owner)
+            self._write_index(entries)
+        return entry
+
+    def open_dataset(self, key):
+        # The counts of the frame point to the memory-mapped file, the labels are
+        # rebuilt as categories from the dictionaries stored in the file
+        if not os.path.exists(self.get_path(key)):
+            raise ValueError('O conjunto de dados não está mais salvo no catálogo.')
+        with pa.memory_map(self.get_path(key)) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True)
+
+    def open_cube(self, key):
+        # The cube saved with the dataset, None if it was saved without one
+        if not os.path.exists(self.get_cube_path(key)):
+            return None
+        with pa.memory_map(self.get_cube_path(key)) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True)
+
+    def get_report(self, key):
+        # Quality report saved with the dataset, None if it was saved without one
+        with self._lock:
+            quality = self._read_index().get(key, {}).get('quality')
+        if quality is None:
+            return None
+        return {**quality, 'checks': pd.DataFrame(quality['checks'])}
+
+    def remove_dataset(self, key, owner=None):
+        # With an owner, only an owner of the dataset can remove it and it is only removed
+        # from their list, the file is deleted once no owner is left. Shared datasets are
+        # only removed without an owner (e.g. by a script) or by the limits of the catalog.
+        with self._lock:
+            entries = self._read_index()
+            entry = entries.get(key)
+            if entry is None or (owner is not None and not is_owner(entry, owner)):
+                return False
+            if owner is not None:
+                entry['owners'].remove(owner)
+            if owner is None or not entry['owners']:
+                del entries[key]
+                self._delete_file(key)
+            self._write_index(entries)
+        return True
+
+    def _add_owner(self, entries, key, owner):
+        # The same data saved by another owner is listed for both
+        entry = entries[key]
+        if owner is not None and entry.get('owners') is not None and owner not in entry['owners']:
+            entry['owners'].append(owner)
+            self._evict(entries, key, owner)
+            self._write_index(entries)
+        return entry
+
+    def _evict(self, entries, new_key, owner):
+        # Keep the catalog within its limits, the oldest datasets are removed first
+        # but never the one just saved
+        oldest = sorted(entries.values(), key=lambda entry: entry['created'])
+        if owner is not None:
+            owned = [entry for entry in oldest if is_owner(entry, owner) and entry['key'] != new_key]
+            for entry in owned[:max(len(owned) + 1 - self.max_owner_datasets, 0)]:
+                entry['owners'].remove(owner)
+                if not entry['owners']:
+                    del entries[entry['key']]
+                    self._delete_file(entry['key'])
+
+        total = sum(self._get_size(entry) for entry in entries.values())
+        for entry in oldest:
+            if len(entries) <= self.max_datasets and total <= self.max_bytes:
+                break
+            if entry['key'] == new_key or entry['key'] not in entries:
+                continue
+            total -= self._get_size(entry)
+            del entries[entry['key']]
+            self._delete_file(entry['key'])
+
+    def _get_size(self, entry):
+        # Datasets saved before their size was recorded are measured on disk
+        if 'bytes' not in entry:
+            paths = [self.get_path(entry['key']), self.get_cube_path(entry['key'])]
+            entry['bytes'] = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+        return entry['bytes']
+
+    def _delete_file(self, key):
+        # Datasets already open keep their mapping of the removed files
+        for path in [self.get_path(key), self.get_cube_path(key)]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _read_index(self):
+        path = os.path.join(self.directory, 'catalog.json')
+        if not os.path.exists(path):
+            return {}
+        with open(path) as file:
+            return json.load(file)
+
+    def _write_index(self, entries):
+        # Write to a temporary file first, so a concurrent reader never sees a partial file
+        path = os.path.join(self.directory, 'catalog.json')
+        with open(path + '.tmp', 'w') as file:
+            json.dump(entries, file, indent=2, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
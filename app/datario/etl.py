@@ -0,0 +1,203 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import unidecode
+
+############## CONFIG ##############
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data')
+RAW_DATA_FILE = os.path.join(DATA_DIR, '01_raw', '2674.xls')
+CACHE_DIR = os.path.join(DATA_DIR, '02_processed', 'etl_cache')
+PROCESSED_FILE = os.path.join(DATA_DIR, '02_processed', 'total_continentes.csv')
+
+COLUMNS = ['País', 'Continente', 'Aérea', 'Marítima', 'Total', 'Ano']
+COUNT_COLUMNS = ['Aérea', 'Marítima', 'Total']
+
+# Primeiro ano com o layout descrito em continent_range
+FIRST_YEAR = 2016
+
+# Dicionário com o range de linhas de cada continente no arquivo
+# A primeira linha é a do total do continente, seguida das linhas de cada país
+continent_range = {
+    'África': '9:11',
+    'América Central e Caribe': '21:11',
+    'América do Norte': '33:3',
+    'América do Sul': '37:12',
+    'Ásia': '50:19',
+    'Europa': '70:33',
+    'Oceania': '104:3',
+    'Países não especificados': '107:1',
+}
+
+# Se o row do País conter "Outros países" substitui por "Outros"
+others_map = {
+    'Outros países da Europa': 'Outros - Europa',
+    'Outros países da Oceania': 'Outros - Oceania',
+    'Outros países da África': 'Outros - África',
+    'Outros países da Ásia': 'Outros - Ásia',
+    'Outros países da América do Sul': 'Outros - América do Sul',
+    'Outros países da América do Norte': 'Outros - América do Norte',
+    'Outros países da América Central e Caribe': 'Outros - América Central e Caribe',
+}
+
+
+############## UTIL FUNCTIONS ##############
+
+def sanitize_file_name(file_name):
+    """
+    Converte o nome do arquivo para um formato padronizado
+    """
+    file_name = unidecode.unidecode(file_name)
+    return file_name.lower().replace(' ', '_')
+
+
+def get_year_sheets(workbook):
+    """
+    Retorna as planilhas de cada ano disponíveis no arquivo
+    """
+    return [sheet for sheet in workbook.sheet_names
+            if sheet.isdigit() and int(sheet) >= FIRST_YEAR]
+
+
+def get_sheet_checksum(sheet):
+    """
+    Retorna um hash do conteúdo de uma planilha
+    """
+    values = pd.util.hash_pandas_object(sheet.astype(str), index=False)
+    return hashlib.sha1(values.to_numpy().tobytes()).hexdigest()
+
+
+############## TRANSFORM FUNCTIONS ##############
+
+def get_continent_rows():
+    """
+    Retorna o índice das linhas de todos os países e o continente de cada linha
+    """
+    ranges = [value.split(':') for value in continent_range.values()]
+    # Country rows start right after the row with the total of the continent
+    starts = np.array([int(start) + 1 for start, _ in ranges])
+    lengths = np.array([int(length) for _, length in ranges])
+
+    # Offset of each row inside its continent range
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    rows = np.repeat(starts, lengths) + offsets
+    continents = np.repeat(list(continent_range), lengths)
+    return rows, continents
+
+
+def transform_year_sheet(sheet, year):
+    """
+    Retorna um DataFrame normalizado com os dados de todos os continentes de um ano
+    """
+    rows, continents = get_continent_rows()
+    df = sheet.iloc[rows, :4].reset_index(drop=True)
+    df.columns = ['País', 'Total', 'Aérea', 'Marítima']
+
+    # Troca '-' por 0 nas colunas Total, Aérea e Marítima e converte para inteiros
+    df[COUNT_COLUMNS] = df[COUNT_COLUMNS].replace('-', '0').astype(int)
+
+    # Normalize 'País' column
+    # If the country has a "," keep only the last part
+    country = df['País'].astype(str)
+    has_comma = country.str.contains(',', regex=False)
+    country = country.where(~has_comma, country.str.split(',').str[-1].str.strip())
+    df['País'] = country.replace(others_map)
+
+    df['Continente'] = continents
+    df['Ano'] = year
+    return df[COLUMNS]
+
+
+############## CACHE FUNCTIONS ##############
+
+def read_manifest(cache_dir):
+    path = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def get_temp_path(path):
+    # Each process and thread writes its own temporary file, two loads may run at once
+    return f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+
+
+def write_manifest(cache_dir, manifest):
+    # Write to a temporary file first, so a concurrent reader never sees a partial file
+    path = os.path.join(cache_dir, 'manifest.json')
+    temp_path = get_temp_path(path)
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp_path, path)
+
+
+def get_cached_year_path(cache_dir, year, checksum):
+    return os.path.join(cache_dir, f'{year}-{checksum[:16]}.parquet')
+
+
+############## ETL ##############
+
+def process_year(workbook, year, cache_dir, manifest):
+    """
+    Retorna os dados normalizados de um ano, reaproveitando o cache se a planilha não mudou
+    """
+    # Each sheet is read only once, the continents are sliced from it in memory
+    sheet = pd.read_excel(workbook, year, header=None, usecols='A:D')
+    checksum = get_sheet_checksum(sheet)
+    path = get_cached_year_path(cache_dir, year, checksum)
+    if manifest.get(year) == checksum and os.path.exists(path):
+        return year, checksum, pd.read_parquet(path), False
+
+    # Write to a temporary file first, so another load never reads a partial file
+    df = transform_year_sheet(sheet, year)
+    temp_path = get_temp_path(path)
+    df.to_parquet(temp_path, index=False)
+    os.replace(temp_path, path)
+    return year, checksum, df, True
+
+
+def process_workbook(file=RAW_DATA_FILE, cache_dir=CACHE_DIR, years=None, max_workers=4,
+                     progress=None):
+    """
+    Retorna um DataFrame com os dados de todos os anos da planilha do DataRio.
+    Apenas as planilhas novas ou alteradas desde a última execução são processadas.
+    Se informado, progress recebe a fração (de 0 a 1) das planilhas já processadas.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = read_manifest(cache_dir)
+
+    with pd.ExcelFile(file) as workbook:
+        years = years or get_year_sheets(workbook)
+        processed = []
+
+        def process(year):
+            result = process_year(workbook, year, cache_dir, manifest)
+            processed.append(year)
+            if progress is not None:
+                progress(len(processed) / len(years))
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(process, years))
+
+    # Remove the cached files of sheets that changed
+    for year, checksum, _, processed in results:
+        old_checksum = manifest.get(year)
+        if processed and old_checksum and old_checksum != checksum:
+            old_path = get_cached_year_path(cache_dir, year, old_checksum)
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        manifest[year] = checksum
+    write_manifest(cache_dir, manifest)
+
+    return pd.concat([df for _, _, df, _ in results], ignore_index=True)
+
+
+if __name__ == '__main__':
+    # Salva os dados de todos os continentes em um arquivo CSV
+    process_workbook().to_csv(PROCESSED_FILE, index=False)
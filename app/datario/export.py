@@ -0,0 +1,63 @@
+"""Serialization of the data to the formats offered for download."""
+import io
+import threading
+from collections import OrderedDict
+
+# Files kept by the ExportCache, the oldest are dropped over any of the limits
+EXPORT_CACHE_SIZE = 16
+EXPORT_CACHE_BYTES = 256 * 1024 ** 2
+
+# Formats available for upload and download: extension and mime type
+FILE_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet')
+}
+
+
+def encode_data(data, file_format):
+    # Serialize the data to one of the FILE_FORMATS
+    if file_format == 'Parquet':
+        buffer = io.BytesIO()
+        data.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    return data.to_csv(index=False)
+
+
+class ExportCache:
+    # Serialized files shared by all sessions, keyed by the dataset and the selection they
+    # were made from. Bounded by the number of files and their total size, a file larger than
+    # the size limit is served but not kept.
+    def __init__(self, max_entries=EXPORT_CACHE_SIZE, max_bytes=EXPORT_CACHE_BYTES):
+        self._lock = threading.Lock()
+        self._files = OrderedDict()
+        self._bytes = 0
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, data, file_format):
+        with self._lock:
+            if key in self._files:
+                self.hits += 1
+                self._files.move_to_end(key)
+                return self._files[key]
+            self.misses += 1
+
+        # Serialize outside the lock so other exports are not blocked
+        content = encode_data(data, file_format)
+        if len(content) > self._max_bytes:
+            return content
+        with self._lock:
+            if key not in self._files:
+                self._files[key] = content
+                self._bytes += len(content)
+            while len(self._files) > self._max_entries or self._bytes > self._max_bytes:
+                _, dropped = self._files.popitem(last=False)
+                self._bytes -= len(dropped)
+        return content
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._files),
+                    'bytes': self._bytes}
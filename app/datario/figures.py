@@ -0,0 +1,276 @@
+"""Figures of the Explorador charts and the cache they are shared through.
+
+Plotly and pydeck are only imported when a figure is built, so importing the engine stays cheap.
+"""
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+from .aggregate import CUBE_DIMENSIONS, CUBE_MEASURES, rollup_cube, get_data_fingerprint
+from .globe import build_globe_data, build_globe_deck
+
+FIGURE_CACHE_SIZE = 256
+
+# Adaptive rendering: data with many categories or points is reduced when its figure is built,
+# so the size of the figure sent to the browser doesn't grow with the cardinality of the data.
+# Bars and series above these limits are summed in OTHERS_LABEL (followed by '*' if the data has
+# a label with that name), and the years of a series with more than MAX_POINTS points are summed
+# in buckets of consecutive years.
+MAX_CATEGORIES = 100
+MAX_SERIES = 12
+MAX_POINTS = 2000
+OTHERS_LABEL = 'Outros'
+
+# Line charts with more points than this are drawn with WebGL
+WEBGL_POINTS = 500
+
+
+class FigureCache:
+    # Figures shared by all sessions, keyed by the chart, its parameters and a hash of its data.
+    # Reruns that don't change the data of a chart (e.g. a change in the sidebar) reuse its figure.
+    # A figure may also be found by an alias, e.g. the dataset and the filters it was built for,
+    # so a rerun with the same filters finds it without preparing and hashing its data again.
+    def __init__(self, max_entries=FIGURE_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._figures = OrderedDict()
+        self._aliases = OrderedDict()
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build, alias=None):
+        with self._lock:
+            if key in self._figures:
+                self.hits += 1
+                self._figures.move_to_end(key)
+                self._add_alias(alias, key)
+                return self._figures[key]
+            self.misses += 1
+
+        # Build outside the lock so other charts are not blocked
+        fig = build()
+        with self._lock:
+            self._figures[key] = fig
+            if len(self._figures) > self._max_entries:
+                self._figures.popitem(last=False)
+            self._add_alias(alias, key)
+        return fig
+
+    def find(self, alias):
+        # The figure of an alias if it is still cached, None otherwise. Cheap enough
+        # to be called in the script thread before submitting a build.
+        with self._lock:
+            key = self._aliases.get(alias)
+            if key not in self._figures:
+                return None
+            self.hits += 1
+            self._figures.move_to_end(key)
+            self._aliases.move_to_end(alias)
+            return self._figures[key]
+
+    def _add_alias(self, alias, key):
+        # Aliases of evicted figures are dropped with the oldest aliases
+        if alias is None:
+            return
+        self._aliases[alias] = key
+        self._aliases.move_to_end(alias)
+        if len(self._aliases) > self._max_entries:
+            self._aliases.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._figures)}
+
+
+def get_visitors_by_year(cube):
+    # Group by year
+    return rollup_cube(cube, 'Ano')
+
+
+def get_visitors_by_country(cube):
+    # Group by country
+    return rollup_cube(cube, 'País')
+
+
+def get_visitors_by_year_and_continent(cube):
+    # Group by year and continent
+    return rollup_cube(cube, ['Ano', 'Continente'])
+
+
+def get_visitors_by_medium(cube):
+    # Total of tourists by air and by sea
+    return pd.DataFrame({'Meio': ['Aérea', 'Marítima'],
+                         'Total': [cube['Aérea'].sum(), cube['Marítima'].sum()]})
+
+
+def get_key_columns(data, *exclude):
+    # Columns of a roll up that are not counts, e.g. Ano and Continente
+    return [col for col in data.columns if col not in CUBE_MEASURES and col not in exclude]
+
+
+def get_others_label(labels):
+    # OTHERS_LABEL, or a variant of it if the data already has a label with that name
+    label = OTHERS_LABEL
+    while label in labels:
+        label += '*'
+    return label
+
+
+def limit_categories(data, column, max_categories=MAX_CATEGORIES):
+    # Keep the categories of the column with the most tourists and sum the others in
+    # OTHERS_LABEL, which comes after the kept categories (in their original order)
+    totals = data.groupby(column, observed=True)['Total'].sum()
+    if len(totals) <= max_categories:
+        return data
+    kept = set(totals.nlargest(max_categories - 1).index)
+    others = get_others_label(totals.index)
+    labels = pd.Series(pd.Categorical(
+        data[column].astype(object).where(data[column].isin(kept), others),
+        categories=[value for value in totals.index if value in kept] + [others]),
+        index=data.index, name=column)
+    keys = [data[col] for col in get_key_columns(data, column)] + [labels]
+    return data[CUBE_MEASURES].groupby(keys, observed=True).sum().reset_index()[data.columns]
+
+
+def bucket_years(data, max_points=MAX_POINTS):
+    # Sum consecutive years in buckets (e.g. 2006–2009) when the series have more
+    # points than max_points, the number of series is kept
+    if len(data) <= max_points:
+        return data
+    years = data['Ano']
+    if isinstance(years.dtype, pd.CategoricalDtype):
+        order = years.cat.categories[np.unique(years.cat.codes.to_numpy())]
+    else:
+        order = pd.Index(np.sort(years.unique()))
+    size = math.ceil(len(data) / max_points)
+    buckets = [f'{order[start]}–{order[min(start + size, len(order)) - 1]}'
+               for start in range(0, len(order), size)]
+    labels = pd.Series(pd.Categorical.from_codes(
+        order.get_indexer(years.to_numpy()) // size, categories=buckets),
+        index=data.index, name='Ano')
+    keys = [labels] + [data[col] for col in get_key_columns(data, 'Ano')]
+    return data[CUBE_MEASURES].groupby(keys, observed=True).sum().reset_index()[data.columns]
+
+
+def get_render_mode(data):
+    return 'webgl' if len(data) > WEBGL_POINTS else 'auto'
+
+
+def line_visitors_by_year(data):
+    import plotly.express as px
+
+    # Plot the total number of tourists by year
+    data = bucket_years(data)
+    return px.line(
+        data, x='Ano', y='Total', title='Total de Turistas por Ano',
+        labels={'Ano': 'Ano', 'Total': 'Total de Turistas'},
+        template='plotly_dark',
+        markers=True,
+        render_mode=get_render_mode(data)
+    )
+
+
+def line_visitors_by_year_comparison(data):
+    import plotly.express as px
+
+    # Plot the total number of tourists by year of each dataset compared
+    data = bucket_years(data)
+    return px.line(
+        data, x='Ano', y='Total', color='Conjunto', title='Total de Turistas por Ano',
+        labels={'Ano': 'Ano', 'Total': 'Total de Turistas'},
+        template='plotly_dark',
+        markers=True,
+        render_mode=get_render_mode(data)
+    )
+
+
+def bar_visitors_by_country(data, height=700):
+    import plotly.express as px
+
+    # Plot the total number of tourists by country, only the countries
+    # with the most tourists get their own bar
+    data = limit_categories(data, 'País')
+    return px.bar(
+        data, x='País', y='Total', title='Total de Turistas por País',
+        labels={'País': 'País', 'Total': 'Total de Turistas'},
+        template='plotly_dark',
+        height=height
+    )
+
+
+def area_visitors_by_year(data, height=400):
+    import plotly.express as px
+
+    # Plot the total number of tourists by year and continent, area charts have
+    # no WebGL traces so the series and the years are limited instead
+    data = bucket_years(limit_categories(data, 'Continente', MAX_SERIES))
+    return px.area(
+        data, x='Ano', y='Total', color='Continente',
+        title='Total de Turistas por Ano e Continente',
+        labels={'Ano': 'Ano', 'Total': 'Total de Turistas'},
+        template='plotly_dark',
+        height=height
+    )
+
+
+def pie_visitors_by_medium(data):
+    import plotly.express as px
+
+    # Make a pie chart comparing the percentage of tourists by air and sea
+    return px.pie(
+        names=data['Meio'].tolist(),
+        values=data['Total'].tolist(),
+        labels={'value': 'Total de Turistas'},
+        title='Porcentagem de Turistas por Meio de Transporte'
+    )
+
+
+# Charts of the Explorador: the roll up of the cube they show and the function building their figure
+CHARTS = {
+    'line_visitors_by_year': (get_visitors_by_year, line_visitors_by_year),
+    'bar_visitors_by_country': (get_visitors_by_country, bar_visitors_by_country),
+    'area_visitors_by_year': (get_visitors_by_year_and_continent, area_visitors_by_year),
+    'pie_visitors_by_medium': (get_visitors_by_medium, pie_visitors_by_medium),
+    'globe': (build_globe_data, build_globe_deck)
+}
+
+
+def build_chart_data(cube):
+    # Data of all the charts for a cube, kept for the unfiltered cube of each dataset
+    return {chart: prepare(cube) for chart, (prepare, _) in CHARTS.items()}
+
+
+def append_chart_data(chart_data, delta_cube):
+    # Data of the charts of a cube with the rows of delta_cube appended (see append_cube).
+    # The roll ups of the cube are merged with those of delta_cube, the cube is not scanned.
+    dtypes = {col: delta_cube[col].dtype for col in CUBE_DIMENSIONS}
+    appended = {}
+    for chart in ['line_visitors_by_year', 'bar_visitors_by_country', 'area_visitors_by_year']:
+        prepare = CHARTS[chart][0]
+        data = chart_data[chart]
+        data = data.astype({col: dtype for col, dtype in dtypes.items() if col in data.columns})
+        appended[chart] = prepare(pd.concat([data, prepare(delta_cube)], ignore_index=True))
+    medium = chart_data['pie_visitors_by_medium']
+    appended['pie_visitors_by_medium'] = medium.assign(
+        Total=medium['Total'] + get_visitors_by_medium(delta_cube)['Total'])
+    # The bars of the globe are the totals by country
+    appended['globe'] = build_globe_data(appended['bar_visitors_by_country'])
+    return appended
+
+
+def get_chart_figure(cache, chart, cube, chart_data=None, alias=None):
+    # Figure of a chart for a (filtered) cube, only built if the cache has no figure for its data.
+    # The data of the charts of the cube is only computed if not given. With an alias (e.g. the
+    # dataset and the filters of the cube), the figure is found again by cache.find((chart,) + alias).
+    prepare, build = CHARTS[chart]
+    data = chart_data[chart] if chart_data is not None else prepare(cube)
+    return cache.get((chart, get_data_fingerprint(data)), lambda: build(data),
+                     (chart,) + alias if alias is not None else None)
+
+
+def precompute_figures(cache, cube, chart_data=None, alias=None):
+    # Build the figures of all the charts, e.g. for the unfiltered cube right after a load
+    for chart in CHARTS:
+        get_chart_figure(cache, chart, cube, chart_data, alias)
@@ -0,0 +1,67 @@
+"""pt-BR number formatting (1.234.567) without the system locale.
+
+The output is the same as locale.format_string('%d', number, grouping=True)
+under pt_BR.UTF-8: the number is truncated to an integer and the thousands
+are separated by dots.
+"""
+import functools
+import numpy as np
+import pandas as pd
+
+THOUSANDS_SEPARATOR = '.'
+
+# Characters of the longest int64, with its sign
+MAX_LENGTH = len(str(np.iinfo(np.int64).min))
+
+
+def format_number(number):
+    # Convert to number if necessary
+    if isinstance(number, str):
+        number = int(number)
+    return f'{int(number):,}'.replace(',', THOUSANDS_SEPARATOR)
+
+
+@functools.lru_cache(maxsize=None)
+def get_separator_layout(length, negative):
+    # Column of the plain number copied to each column of the formatted one, for the
+    # numbers of this length, and the columns where a separator goes
+    sign = int(negative)
+    digits = length - sign
+    columns = list(range(sign))
+    separators = []
+    for digit in range(digits):
+        if digit and (digits - digit) % 3 == 0:
+            separators.append(len(columns))
+            columns.append(0)
+        columns.append(sign + digit)
+    return np.array(columns), np.array(separators, dtype=np.intp)
+
+
+def format_numbers(values):
+    # Format a whole Series (or array) at once, missing values become empty strings.
+    # numpy converts the numbers to text, then the separators are inserted at the same
+    # columns for all the numbers of the same length, working on the code points.
+    series = pd.Series(values, copy=False)
+    missing = series.isna().to_numpy()
+    if missing.any():
+        numbers = series.to_numpy(dtype=np.float64, na_value=0)
+    else:
+        numbers = series.to_numpy()
+    # Casting truncates the floats, as %d does
+    numbers = numbers.astype(np.int64)
+
+    text = numbers.astype(f'U{MAX_LENGTH}')
+    chars = text.view(np.uint32).reshape(len(numbers), MAX_LENGTH)
+    lengths = np.char.str_len(text)
+    negative = numbers < 0
+
+    strings = np.empty(len(numbers), dtype=object)
+    groups = lengths * 2 + negative
+    for group in np.unique(groups):
+        rows = np.flatnonzero(groups == group)
+        columns, separators = get_separator_layout(int(group) // 2, bool(group % 2))
+        formatted = chars[rows[:, None], columns]
+        formatted[:, separators] = ord(THOUSANDS_SEPARATOR)
+        strings[rows] = formatted.view(f'U{len(columns)}').ravel()
+    strings[missing] = ''
+    return pd.Series(strings, index=series.index, name=series.name, dtype=object)
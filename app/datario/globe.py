@@ -0,0 +1,107 @@
+"""Data and pydeck layers of the 3D globe.
+
+pydeck is only imported when a deck is built, so importing the engine stays cheap.
+"""
+import os
+import functools
+import numpy as np
+import pandas as pd
+
+from .aggregate import rollup_cube
+
+COORDINATES_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', '02_processed',
+    'country_coordinates.csv')
+
+
+@functools.lru_cache(maxsize=None)
+def load_country_coordinates(coordinates_file=COORDINATES_FILE):
+    # Coordinates of each country, loaded once per process and indexed by País
+    df_lat_lon = pd.read_csv(coordinates_file)
+    df_lat_lon = df_lat_lon.dropna(subset=['Latitude', 'Longitude'])
+    return df_lat_lon.set_index('Country')[['Latitude', 'Longitude']]
+
+
+def build_globe_data(data, coordinates=None):
+    # Sum the number of tourists by country keeping only the columns we need
+    data = rollup_cube(data, 'País')
+
+    # Look up the coordinates of each country, countries without coordinates are dropped
+    if coordinates is None:
+        coordinates = load_country_coordinates()
+    positions = coordinates.index.get_indexer(data['País'].astype(str))
+    found = positions >= 0
+    data = data[found]
+    lat_lon = coordinates.to_numpy()[positions[found]]
+
+    air = data['Aérea'].to_numpy()
+    sea = data['Marítima'].to_numpy()
+    return pd.DataFrame({
+        'País': data['País'].astype(str).to_numpy(),
+        'Aérea': air,
+        'Marítima': sea,
+        'Latitude': lat_lon[:, 0],
+        'Longitude': lat_lon[:, 1],
+        # Add an offset for the "Marítima" bars to avoid overlap
+        'Longitude_offset': lat_lon[:, 1] + 2,
+        # Add new columns as source for the height of the bars
+        # and normalize the values using a logarithmic scale
+        'Aérea_Normalized': np.log1p(air) * 5,
+        'Marítima_Normalized': np.log1p(sea) * 5
+    })
+
+
+def build_globe_deck(data):
+    # The data is the result of build_globe_data
+    import pydeck as pdk
+
+    elevation_scale = 40000
+    elevation_range = [0, 40000]
+
+    # Create a ColumnLayer for the Aérea (Air) data
+    air_column_layer = pdk.Layer(
+        'ColumnLayer',
+        data,
+        get_position='[Longitude, Latitude]',
+        get_elevation='Aérea_Normalized',  # Column height based on air tourist data
+        elevation_scale=elevation_scale,
+        get_fill_color=[255, 0, 0],
+        elevation_range=elevation_range,
+        radius=100000,
+        pickable=True,
+        extruded=True,
+        auto_highlight=True
+    )
+
+    # Create a ColumnLayer for the Marítima (Sea) data with an offset
+    sea_column_layer = pdk.Layer(
+        'ColumnLayer',
+        data,
+        get_position='[Longitude_offset, Latitude]',
+        get_elevation='Marítima_Normalized',
+        elevation_scale=elevation_scale,
+        elevation_range=elevation_range,
+        get_fill_color=[0, 0, 255],
+        radius=100000,
+        pickable=True,
+        extruded=True,
+        auto_highlight=True
+    )
+
+    # Create the deck with an orbital view for a globe-like appearance
+    view_state = pdk.ViewState(
+        latitude=0,
+        longitude=0,
+        zoom=1,
+        pitch=45,
+        bearing=0
+    )
+
+    # Create the deck with the two column layers, text layer, and orbital view
+    return pdk.Deck(
+        layers=[air_column_layer, sea_column_layer],
+        initial_view_state=view_state,
+        map_provider='mapbox',
+        map_style='mapbox://styles/mapbox/light-v9',
+        tooltip={"text": "{País}\n{Aérea} Aérea / {Marítima} Marítima"},
+    )
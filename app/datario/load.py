@@ -0,0 +1,142 @@
+"""Validated, chunked readers for the uploaded CSV and Parquet files."""
+import io
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import pyarrow.parquet as pq
+import pyarrow.types as pa_types
+
+from .schema import REQUIRED_COLUMNS, CATEGORY_COLUMNS, COUNT_COLUMNS, compact_dtypes
+from .formatting import format_number
+
+# Limits for the uploaded files
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+MAX_UPLOAD_ROWS = 10_000_000
+UPLOAD_CHUNK_ROWS = 100_000
+
+
+def concat_chunks(chunks):
+    # Concatenate the parsed chunks, merging the categories of the labels. Counts that
+    # are not integers in some chunk (e.g. '-') are kept as they are for the validation.
+    data = pd.DataFrame({
+        col: union_categoricals([chunk[col] for chunk in chunks])
+        if col in CATEGORY_COLUMNS
+        else np.concatenate([chunk[col].to_numpy() for chunk in chunks])
+        for col in REQUIRED_COLUMNS
+    })
+    return compact_dtypes(data)
+
+
+def read_data_csv(csv_file, max_bytes=MAX_UPLOAD_BYTES, max_rows=MAX_UPLOAD_ROWS,
+                  chunk_rows=UPLOAD_CHUNK_ROWS, progress=None):
+    # Reject files over the size limit before reading them
+    size = csv_file.seek(0, io.SEEK_END)
+    csv_file.seek(0)
+    if size > max_bytes:
+        raise ValueError(
+            f'O arquivo excede o limite de {format_number(max_bytes // 1024 ** 2)} MB.')
+
+    # Check the header before parsing the rest of the file
+    try:
+        header = pd.read_csv(csv_file, nrows=0).columns
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Não foi possível ler o cabeçalho do arquivo.')
+    finally:
+        csv_file.seek(0)
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in header]
+    if missing_columns:
+        raise ValueError(
+            f'Colunas ausentes no arquivo: {", ".join(missing_columns)}.')
+
+    # Estimate the number of rows from the beginning of the file to report the progress
+    sample = csv_file.read(64 * 1024)
+    csv_file.seek(0)
+    estimated_rows = max(size * sample.count(b'\n') // max(len(sample), 1), 1)
+
+    # Parse the file in chunks, already with their final types, so only one chunk is
+    # kept with the original types in memory. The types of the counts are inferred:
+    # placeholders and other invalid values are cleaned by the validation of the data.
+    reader = pd.read_csv(csv_file, usecols=REQUIRED_COLUMNS, chunksize=chunk_rows,
+                         dtype={col: 'category' for col in CATEGORY_COLUMNS})
+    chunks = []
+    rows = 0
+    try:
+        for chunk in reader:
+            rows += len(chunk)
+            if rows > max_rows:
+                break
+            chunks.append(compact_dtypes(chunk))
+            if progress is not None:
+                progress(min(rows / estimated_rows, 1.0))
+    except (ValueError, UnicodeDecodeError):
+        # Malformed files (e.g. an unclosed quote) are rejected while parsing. The failing
+        # row is somewhere in the chunk being parsed, whose lines follow the header and the
+        # rows of the chunks already read. The lines are approximate: blank lines and quoted
+        # fields with line breaks don't count as rows.
+        raise ValueError(
+            f'Valores inválidos próximos às linhas {format_number(rows + 2)} a '
+            f'{format_number(rows + chunk_rows + 1)} do arquivo.')
+    finally:
+        reader.close()
+
+    if rows > max_rows:
+        raise ValueError(
+            f'O arquivo excede o limite de {format_number(max_rows)} linhas.')
+    if rows == 0:
+        raise ValueError('O arquivo não possui dados.')
+    return concat_chunks(chunks)
+
+
+def is_count_type(arrow_type):
+    return (pa_types.is_integer(arrow_type) or pa_types.is_floating(arrow_type)
+            or pa_types.is_string(arrow_type) or pa_types.is_large_string(arrow_type))
+
+
+def read_data_parquet(parquet_file, max_bytes=MAX_UPLOAD_BYTES, max_rows=MAX_UPLOAD_ROWS,
+                      chunk_rows=UPLOAD_CHUNK_ROWS, progress=None):
+    # Reject files over the size limit before reading them
+    size = parquet_file.seek(0, io.SEEK_END)
+    parquet_file.seek(0)
+    if size > max_bytes:
+        raise ValueError(
+            f'O arquivo excede o limite de {format_number(max_bytes // 1024 ** 2)} MB.')
+
+    # The schema and the number of rows are read from the file metadata
+    try:
+        file = pq.ParquetFile(parquet_file)
+    except Exception:
+        raise ValueError('Não foi possível ler os metadados do arquivo.')
+    schema = file.schema_arrow
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in schema.names]
+    if missing_columns:
+        raise ValueError(
+            f'Colunas ausentes no arquivo: {", ".join(missing_columns)}.')
+    # Numbers and text are cleaned by the validation of the data, other types are rejected
+    invalid_columns = [col for col in COUNT_COLUMNS if not is_count_type(schema.field(col).type)]
+    if invalid_columns:
+        raise ValueError(
+            f'Colunas com valores não numéricos: {", ".join(invalid_columns)}.')
+
+    rows = file.metadata.num_rows
+    if rows > max_rows:
+        raise ValueError(
+            f'O arquivo excede o limite de {format_number(max_rows)} linhas.')
+    if rows == 0:
+        raise ValueError('O arquivo não possui dados.')
+
+    # Read only the required columns, one batch at a time
+    chunks = []
+    read_rows = 0
+    for batch in file.iter_batches(batch_size=chunk_rows, columns=REQUIRED_COLUMNS):
+        chunks.append(compact_dtypes(batch.to_pandas()))
+        read_rows += batch.num_rows
+        if progress is not None:
+            progress(min(read_rows / rows, 1.0))
+    return concat_chunks(chunks)
+
+
+def read_data_file(uploaded_file, progress=None):
+    # Any file-like object with a name, e.g. a Streamlit upload or an open file
+    if uploaded_file.name.endswith('.parquet'):
+        return read_data_parquet(uploaded_file, progress=progress)
+    return read_data_csv(uploaded_file, progress=progress)
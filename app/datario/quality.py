@@ -0,0 +1,175 @@
+"""Data quality checks, run once on each dataset loaded and before it is aggregated.
+
+The checks are vectorized: the labels are checked on their categories and the counts
+on whole columns. They return the cleaned data and a report of what was found.
+"""
+import numpy as np
+import pandas as pd
+
+from .schema import CATEGORY_COLUMNS, COUNT_COLUMNS, compact_dtypes
+from .globe import load_country_coordinates
+
+# Placeholders of the DataRio workbook for a count of zero
+ZERO_PLACEHOLDERS = ['-']
+
+# Periods of the Ano column: a year or a month of a year
+PERIOD_PATTERN = r'\d{4}(-(0[1-9]|1[0-2]))?'
+
+# Values of the rows failing a check listed in the report
+MAX_EXAMPLES = 5
+
+# What is done with the rows failing each check
+REMOVED = 'Linhas removidas'
+FIXED = 'Valores corrigidos'
+KEPT = 'Apenas informado'
+
+
+def get_examples(column, mask, column2=None):
+    # First distinct labels (or pairs of labels) of the rows failing a check,
+    # decoded from the category codes of those rows only
+    codes = column.cat.codes.to_numpy()[mask].astype(np.int64)
+    if column2 is not None:
+        codes = codes * (len(column2.cat.categories) + 1) + column2.cat.codes.to_numpy()[mask] + 1
+    examples = []
+    for code in pd.unique(codes)[:MAX_EXAMPLES]:
+        if column2 is None:
+            examples.append(get_label(column, code))
+        else:
+            code, code2 = divmod(code, len(column2.cat.categories) + 1)
+            examples.append(f'{get_label(column, code)} / {get_label(column2, code2 - 1)}')
+    return ', '.join(examples)
+
+
+def get_label(column, code):
+    return str(column.cat.categories[code]) if code >= 0 else ''
+
+
+def normalize_labels(column):
+    # Labels as categories of stripped strings, years read as numbers (e.g. 2017.0) written
+    # as 2017. Only the categories are converted, labels that become equal are merged.
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype('category')
+    labels = [str(int(value)) if isinstance(value, float) and value.is_integer()
+              else str(value).strip() for value in column.cat.categories]
+    if labels == list(column.cat.categories):
+        return column
+    categories, recode = np.unique(labels, return_inverse=True)
+    codes = column.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, recode[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories.astype(object)),
+                     index=column.index, name=column.name)
+
+
+def get_category_mask(column, invalid_categories):
+    # Rows whose label is missing or one of the invalid categories, from the categories only
+    codes = column.cat.codes.to_numpy()
+    return np.append(invalid_categories, True)[codes]
+
+
+def parse_counts(column):
+    # The counts as int64, the zero placeholders replaced and the values that are not
+    # integers marked as invalid. Returns the counts, the invalid and the replaced rows.
+    if pd.api.types.is_integer_dtype(column.dtype):
+        values = column.to_numpy(np.int64)
+        return values, np.zeros(len(values), dtype=bool), np.zeros(len(values), dtype=bool)
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        numbers = column.to_numpy(np.float64, na_value=np.nan)
+        replaced = np.zeros(len(numbers), dtype=bool)
+    else:
+        text = column.astype(str).str.strip()
+        replaced = text.isin(ZERO_PLACEHOLDERS).to_numpy()
+        numbers = pd.to_numeric(text.where(~replaced, '0'), errors='coerce').to_numpy(np.float64)
+    invalid = ~np.isfinite(numbers) | (numbers != np.round(numbers))
+    return np.where(invalid, 0, numbers).astype(np.int64), invalid, replaced
+
+
+def validate_data(data, coordinates=None):
+    # Check the loaded data and return the cleaned data (with the compact types) and the report.
+    # The columns fixed are replaced in a shallow copy, the arrays of data are not written.
+    data = data.copy(deep=False)
+    checks = []
+
+    def add_check(name, mask, action, column='País', column2=None):
+        checks.append({
+            'Verificação': name, 'Linhas': int(np.count_nonzero(mask)), 'Ação': action,
+            'Exemplos': get_examples(data[column], mask, data[column2] if column2 else None)})
+
+    # Labels: missing or empty labels are removed, periods in another format than a year
+    # or a month (e.g. 2016 or 2016-01) are kept and reported
+    removed = np.zeros(len(data), dtype=bool)
+    for col in CATEGORY_COLUMNS:
+        data[col] = normalize_labels(data[col])
+        categories = data[col].cat.categories
+        mask = get_category_mask(data[col], (categories == '') | categories.isin(['nan', 'None']))
+        add_check(f'{col} ausente', mask, REMOVED, col)
+        removed |= mask
+    periods = np.asarray(data['Ano'].cat.categories.str.fullmatch(PERIOD_PATTERN), dtype=bool)
+    mask = get_category_mask(data['Ano'], ~periods) & ~removed
+    add_check('Período fora do formato AAAA ou AAAA-MM', mask, KEPT, 'Ano')
+
+    # Counts: placeholders are zeros, other values that are not integers and negative counts
+    # are removed
+    counts = {}
+    placeholders = np.zeros(len(data), dtype=bool)
+    invalid = np.zeros(len(data), dtype=bool)
+    for col in COUNT_COLUMNS:
+        counts[col], col_invalid, col_replaced = parse_counts(data[col])
+        invalid |= col_invalid
+        placeholders |= col_replaced
+    add_check('Contagem com "-" (considerada 0)', placeholders & ~removed, FIXED)
+    add_check('Contagem não numérica', invalid & ~removed, REMOVED)
+    removed |= invalid
+    negative = np.zeros(len(data), dtype=bool)
+    for col in COUNT_COLUMNS:
+        negative |= counts[col] < 0
+    add_check('Contagem negativa', negative & ~removed, REMOVED)
+    removed |= negative
+
+    # Total must be the sum of the arrivals by air and by sea
+    total = counts['Aérea'] + counts['Marítima']
+    inconsistent = (counts['Total'] != total) & ~removed
+    add_check('Total diferente de Aérea + Marítima', inconsistent, FIXED, 'País', 'Ano')
+    counts['Total'] = np.where(inconsistent, total, counts['Total'])
+
+    # Repeated keys and countries without coordinates are kept, only reported
+    country_codes = data['País'].cat.codes.to_numpy().astype(np.int64)
+    year_codes = data['Ano'].cat.codes.to_numpy().astype(np.int64)
+    row_keys = country_codes * len(data['Ano'].cat.categories) + year_codes
+    duplicated = pd.Series(np.where(removed, -1, row_keys)).duplicated().to_numpy() & ~removed
+    add_check('Chave (País, Ano) repetida', duplicated, KEPT, 'País', 'Ano')
+    if coordinates is None:
+        coordinates = load_country_coordinates()
+    located = data['País'].cat.categories.isin(coordinates.index)
+    add_check('País sem coordenadas (fora do globo)',
+              get_category_mask(data['País'], ~located) & ~removed, KEPT)
+
+    for col in COUNT_COLUMNS:
+        data[col] = counts[col]
+    if removed.any():
+        data = data[~removed].reset_index(drop=True)
+        for col in CATEGORY_COLUMNS:
+            data[col] = data[col].cat.remove_unused_categories()
+    if data.empty:
+        raise ValueError('O arquivo não possui dados válidos.')
+
+    report = {
+        'rows': len(removed),
+        'removed': int(np.count_nonzero(removed)),
+        'checks': pd.DataFrame(checks)
+    }
+    return compact_dtypes(data), report
+
+
+def combine_reports(report, other):
+    # Report of a dataset with rows appended, from the reports of both parts
+    checks = pd.concat([report['checks'], other['checks']], ignore_index=True)
+    checks = checks.groupby(['Verificação', 'Ação'], sort=False, as_index=False).agg({
+        'Linhas': 'sum',
+        'Exemplos': lambda values: ', '.join(list(dict.fromkeys(
+            value for value in ', '.join(values).split(', ') if value))[:MAX_EXAMPLES])
+    })[['Verificação', 'Linhas', 'Ação', 'Exemplos']]
+    return {
+        'rows': report['rows'] + other['rows'],
+        'removed': report['removed'] + other['removed'],
+        'checks': checks
+    }
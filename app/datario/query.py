@@ -0,0 +1,189 @@
+"""Query backends for the filter and aggregate steps of the Explorador and Editor.
+
+The pandas backend is always available and filters the pre-aggregated cube.
+Polars and DuckDB are optional: when installed, the filters and the group by
+run as a single lazy, multi-threaded query over the raw rows. The labels are
+queried by their category codes, so the results are converted back to exactly
+the same frames the pandas backend returns.
+"""
+import functools
+import numpy as np
+import pandas as pd
+
+from .aggregate import CUBE_DIMENSIONS, CUBE_MEASURES, apply_filters
+
+DEFAULT_BACKEND = 'pandas'
+
+
+def get_category_code(column, value):
+    # Code of a label in a categorical column, -1 if the label is not present
+    return int(column.cat.categories.get_indexer([value])[0])
+
+
+def get_filter_codes(data, continent='Todos', country='Todos', years=None):
+    # The filters translated to category codes, filters that select everything are left out
+    codes = {}
+    if continent != 'Todos':
+        codes['Continente'] = [get_category_code(data['Continente'], continent)]
+    if country != 'Todos':
+        codes['País'] = [get_category_code(data['País'], country)]
+    if years is not None:
+        year_codes = data['Ano'].cat.categories.get_indexer(list(years))
+        codes['Ano'] = year_codes[year_codes >= 0].tolist()
+    return codes
+
+
+def build_filtered_cube(cube, groups):
+    # Rebuild the rows of the cube from the codes and sums returned by a query, in the
+    # order and with the index they have in the cube, as apply_filters would return them
+    categories = [cube[col].cat.categories for col in CUBE_DIMENSIONS]
+    keys = np.ravel_multi_index(
+        [groups[col] for col in CUBE_DIMENSIONS], [len(values) for values in categories])
+    order = np.argsort(keys, kind='stable')
+    if len(order) == len(cube):
+        return cube
+    cube_keys = np.ravel_multi_index(
+        [cube[col].cat.codes.to_numpy() for col in CUBE_DIMENSIONS],
+        [len(values) for values in categories])
+    positions = np.searchsorted(cube_keys, keys[order])
+    return pd.DataFrame({
+        **{col: pd.Categorical.from_codes(groups[col][order], dtype=cube[col].dtype)
+           for col in CUBE_DIMENSIONS},
+        **{col: groups[col][order].astype('int64') for col in CUBE_MEASURES}
+    }, index=positions)
+
+
+def get_code_frame(data):
+    # Columns used by the queries: category codes for the labels and the counts
+    return {
+        **{col: data[col].cat.codes.to_numpy() for col in CUBE_DIMENSIONS},
+        **{col: data[col].to_numpy() for col in CUBE_MEASURES}
+    }
+
+
+class PandasBackend:
+    # Filters the rows with a numpy mask and the pre-aggregated cube for the summaries
+    name = 'pandas'
+
+    def __init__(self, data, cube):
+        self.data = data
+        self.cube = cube
+
+    def filter_rows(self, continent='Todos', country='Todos', years=None):
+        return apply_filters(self.data, continent, country, years)
+
+    def filter_cube(self, continent='Todos', country='Todos', years=None):
+        return apply_filters(self.cube, continent, country, years)
+
+
+class PolarsBackend(PandasBackend):
+    # Lazy Polars queries: the filters are pushed down to the scan and the
+    # group by runs on all cores
+    name = 'polars'
+
+    def __init__(self, data, cube):
+        import polars as pl
+
+        super().__init__(data, cube)
+        self._pl = pl
+        self._frame = pl.DataFrame(get_code_frame(data)).with_row_index('position')
+
+    def _get_predicate(self, codes):
+        pl = self._pl
+        predicate = pl.lit(True)
+        for col, values in codes.items():
+            predicate &= pl.col(col).is_in(values)
+        return predicate
+
+    def filter_rows(self, continent='Todos', country='Todos', years=None):
+        codes = get_filter_codes(self.data, continent, country, years)
+        rows = (self._frame.lazy()
+                .filter(self._get_predicate(codes))
+                .select('position')
+                .collect()['position'].to_numpy())
+        return self.data.iloc[rows] if len(rows) < len(self.data) else self.data
+
+    def filter_cube(self, continent='Todos', country='Todos', years=None):
+        pl = self._pl
+        codes = get_filter_codes(self.data, continent, country, years)
+        # Rows with a missing label are not part of the cube
+        valid = pl.all_horizontal(pl.col(col) >= 0 for col in CUBE_DIMENSIONS)
+        groups = (self._frame.lazy()
+                  .filter(self._get_predicate(codes) & valid)
+                  .group_by(CUBE_DIMENSIONS)
+                  .agg(pl.col(col).cast(pl.Int64).sum() for col in CUBE_MEASURES)
+                  .collect())
+        return build_filtered_cube(
+            self.cube, {col: groups[col].to_numpy() for col in groups.columns})
+
+
+class DuckDBBackend(PandasBackend):
+    # Embedded DuckDB database with a copy of the codes, queried with SQL in parallel
+    name = 'duckdb'
+
+    def __init__(self, data, cube):
+        import duckdb
+
+        super().__init__(data, cube)
+        self._connection = duckdb.connect()
+        frame = pd.DataFrame(get_code_frame(data))
+        frame['position'] = np.arange(len(frame))
+        self._connection.register('code_frame', frame)
+        self._connection.execute('CREATE TABLE dataset AS SELECT * FROM code_frame')
+        self._connection.unregister('code_frame')
+
+    def _query(self, select, codes, group_by=None):
+        conditions = [f'"{col}" IN (SELECT UNNEST(?))' for col in codes]
+        sql = f'SELECT {select} FROM dataset'
+        if group_by:
+            conditions += [f'"{col}" >= 0' for col in group_by]
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        if group_by:
+            sql += ' GROUP BY ' + ', '.join(f'"{col}"' for col in group_by)
+        # Each query runs in its own cursor, so sessions can query at the same time
+        cursor = self._connection.cursor()
+        try:
+            return cursor.execute(sql, list(codes.values())).fetchnumpy()
+        finally:
+            cursor.close()
+
+    def filter_rows(self, continent='Todos', country='Todos', years=None):
+        codes = get_filter_codes(self.data, continent, country, years)
+        rows = np.sort(self._query('position', codes)['position'])
+        return self.data.iloc[rows] if len(rows) < len(self.data) else self.data
+
+    def filter_cube(self, continent='Todos', country='Todos', years=None):
+        codes = get_filter_codes(self.data, continent, country, years)
+        select = ', '.join([f'"{col}"' for col in CUBE_DIMENSIONS] +
+                           [f'CAST(SUM("{col}") AS BIGINT) AS "{col}"' for col in CUBE_MEASURES])
+        groups = self._query(select, codes, group_by=CUBE_DIMENSIONS)
+        return build_filtered_cube(
+            self.cube, {col: np.asarray(values) for col, values in groups.items()})
+
+
+BACKENDS = {backend.name: backend for backend in [PandasBackend, PolarsBackend, DuckDBBackend]}
+
+# Optional libraries required by each backend
+BACKEND_MODULES = {'polars': 'polars', 'duckdb': 'duckdb'}
+
+
+@functools.lru_cache(maxsize=None)
+def get_available_backends():
+    # Backends whose libraries are installed
+    available = []
+    for name in BACKENDS:
+        module = BACKEND_MODULES.get(name)
+        if module is not None:
+            try:
+                __import__(module)
+            except ImportError:
+                continue
+        available.append(name)
+    return tuple(available)
+
+
+def create_backend(name, data, cube):
+    if name not in BACKENDS:
+        raise ValueError(f'Backend de consulta desconhecido: {name}.')
+    return BACKENDS[name](data, cube)
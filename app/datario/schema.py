@@ -0,0 +1,23 @@
+"""Columns of the dataset and the compact types they are stored with."""
+import pandas as pd
+
+REQUIRED_COLUMNS = ['País', 'Continente', 'Aérea', 'Marítima', 'Total', 'Ano']
+CATEGORY_COLUMNS = ['País', 'Continente', 'Ano']
+COUNT_COLUMNS = ['Aérea', 'Marítima', 'Total']
+
+
+def compact_dtypes(data):
+    # Store repeated labels as categories and the counts as the smallest unsigned int possible
+    for col in CATEGORY_COLUMNS:
+        if col not in data.columns:
+            continue
+        if not isinstance(data[col].dtype, pd.CategoricalDtype):
+            data[col] = data[col].astype(str).astype('category')
+        elif data[col].cat.categories.dtype != object:
+            # Columnar files may store the categories as numbers (e.g. Ano)
+            data[col] = data[col].cat.rename_categories(str)
+    for col in COUNT_COLUMNS:
+        # Counts that are not numbers yet (e.g. '-') are converted by the validation
+        if col in data.columns and pd.api.types.is_numeric_dtype(data[col].dtype):
+            data[col] = pd.to_numeric(data[col], downcast='unsigned')
+    return data
@@ -0,0 +1,53 @@
+"""Literal, case and accent insensitive search over the distinct values of each column."""
+import unicodedata
+import numpy as np
+import pandas as pd
+
+
+def fold_text(text):
+    # Lowercase and remove the accents, so "africa" matches "África"
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def build_search_index(data):
+    # For each column, the folded text of its distinct values and the code of the value of each row
+    index = {}
+    for col in data.columns:
+        if isinstance(data[col].dtype, pd.CategoricalDtype):
+            codes, uniques = data[col].cat.codes.to_numpy(), data[col].cat.categories
+        else:
+            codes, uniques = pd.factorize(data[col])
+        index[col] = (codes, pd.Index([fold_text(value) for value in uniques], dtype=object))
+    return index
+
+
+def search_data(data, index, query, columns=None):
+    # Literal (non regex), case and accent insensitive search,
+    # only the distinct values of each column are scanned
+    query = fold_text(query)
+    mask = np.zeros(len(data), dtype=bool)
+    for col in columns or data.columns:
+        codes, uniques = index[col]
+        # Missing values have the code -1 and never match
+        matches = np.append(np.asarray(uniques.str.contains(query, regex=False), dtype=bool), False)
+        mask |= matches[codes]
+    return mask
+
+
+def append_search_index(index, data, delta):
+    # Index of the data with the rows of delta appended (see append_rows), the values
+    # already indexed are not folded again
+    appended = {}
+    for col, (codes, uniques) in index.items():
+        if isinstance(data[col].dtype, pd.CategoricalDtype):
+            # The new labels are the last categories, the codes of the loaded rows don't change
+            codes = np.concatenate([codes, delta[col].cat.codes.to_numpy()])
+            new_values = data[col].cat.categories[len(uniques):]
+        else:
+            # The loaded rows come first, so their values keep the same order in the uniques
+            codes, values = pd.factorize(data[col])
+            new_values = values[len(uniques):]
+        appended[col] = (codes, uniques.append(
+            pd.Index([fold_text(value) for value in new_values], dtype=object)))
+    return appended
@@ -0,0 +1,119 @@
+"""Datasets shared by all the sessions of the process."""
+import hashlib
+import threading
+import weakref
+
+from .aggregate import build_cube, get_data_fingerprint
+from .append import append_rows, append_cube
+from .figures import append_chart_data
+from .quality import validate_data, combine_reports
+from .search import append_search_index
+from .summary import SummaryIndex
+
+
+class DatasetHandle:
+    # Reference to a shared dataset, kept in the session state
+    def __init__(self, key, data, cube, derived):
+        self.key = key
+        self.data = data
+        self.cube = cube
+        self._derived = derived
+
+    def get_derived(self, name, compute):
+        # Structures derived from the dataset (e.g. search index) are built once
+        # and shared by all sessions holding the dataset
+        if name not in self._derived:
+            self._derived.setdefault(name, compute())
+        return self._derived[name]
+
+    def find_derived(self, name):
+        # The structure if it was already built, None otherwise
+        return self._derived.get(name)
+
+
+class DatasetStore:
+    # Datasets shared by all sessions of the process, identified by a hash of their content.
+    # The frames are read-only and are evicted once no session holds a handle to them.
+    def __init__(self):
+        # Handles may be released by the garbage collector while the lock is held
+        self._lock = threading.RLock()
+        self._entries = {}
+
+    def acquire(self, key, load, validate=True, load_cube=None):
+        # The data loaded is validated unless it was already (e.g. a dataset of the catalog).
+        # load_cube returns the cube of the data if it was saved, None if it must be built.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return self._new_handle(key, entry)
+
+        # Load outside the lock so other datasets are not blocked
+        data = load()
+        if data is None:
+            return None
+        derived = {}
+        if validate:
+            data, derived['quality_report'] = validate_data(data)
+
+        # Pre-aggregate the data once so the charts and metrics don't scan the raw rows,
+        # the index is built from the cube only
+        cube = load_cube() if load_cube is not None else None
+        if cube is None:
+            cube = build_cube(data)
+        derived['summary_index'] = SummaryIndex(cube)
+        entry = {'data': data, 'cube': cube, 'refs': 0, 'derived': derived}
+        with self._lock:
+            # Another session may have loaded the same dataset in the meantime
+            entry = self._entries.setdefault(key, entry)
+            return self._new_handle(key, entry)
+
+    def append(self, dataset, delta):
+        # New dataset with the rows of delta (new years) appended to a dataset of the store.
+        # Only delta is aggregated and hashed: the key is derived from the key of the dataset
+        # and the derived structures that can be extended are updated with the rows of delta.
+        delta, delta_report = validate_data(delta)
+        data, delta = append_rows(dataset.data, delta)
+        key = hashlib.sha1(f'{dataset.key}+{get_data_fingerprint(delta)}'.encode()).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return self._new_handle(key, entry)
+
+        delta_cube = build_cube(delta)
+        cube = append_cube(dataset.cube, delta_cube)
+        summary_index = dataset.get_derived('summary_index', lambda: SummaryIndex(dataset.cube))
+        derived = {'summary_index': summary_index.append(cube, delta_cube)}
+        report = dataset.find_derived('quality_report')
+        derived['quality_report'] = combine_reports(report, delta_report) if report else delta_report
+        chart_data = dataset.find_derived('chart_data')
+        if chart_data is not None:
+            derived['chart_data'] = append_chart_data(chart_data, delta_cube)
+        search_index = dataset.find_derived('search_index')
+        if search_index is not None:
+            derived['search_index'] = append_search_index(search_index, data, delta)
+
+        # The sort ranks and the query backends cover all the rows, they are built again when used
+        entry = {'data': data, 'cube': cube, 'refs': 0, 'derived': derived}
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            return self._new_handle(key, entry)
+
+    def stats(self):
+        with self._lock:
+            return {key: entry['refs'] for key, entry in self._entries.items()}
+
+    def _new_handle(self, key, entry):
+        entry['refs'] += 1
+        handle = DatasetHandle(
+            key, entry['data'], entry['cube'], entry['derived'])
+        weakref.finalize(handle, self._release, key)
+        return handle
+
+    def _release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry['refs'] -= 1
+            if entry['refs'] <= 0:
+                del self._entries[key]
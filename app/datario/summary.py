@@ -0,0 +1,169 @@
+"""Summary index of the cube, answering the Explorador metrics without scanning the rows."""
+import numpy as np
+import pandas as pd
+
+from .aggregate import CUBE_MEASURES, TOP_COUNTRIES
+
+
+class SummaryIndex:
+    # Partial sums of the cube for each (País, Continente) pair and year, their roll up by
+    # country and the countries of each year sorted by Total. A filter combination is
+    # answered by summing the columns of the selected years for the selected pairs.
+    def __init__(self, cube):
+        self.countries = cube['País'].dtype
+        self.continents = cube['Continente'].cat.categories
+        self.years = cube['Ano'].cat.categories
+
+        country_codes = cube['País'].cat.codes.to_numpy()
+        continent_codes = cube['Continente'].cat.codes.to_numpy()
+        year_codes = cube['Ano'].cat.codes.to_numpy()
+        n_countries = len(self.countries.categories)
+        n_years = len(self.years)
+
+        # Partial sums by pair and year, the cube has one row for each of them
+        pairs, pair_rows = np.unique(
+            country_codes.astype(np.int64) * len(self.continents) + continent_codes,
+            return_inverse=True)
+        self.pair_country = pairs // len(self.continents)
+        self.pair_continent = pairs % len(self.continents)
+        self.pair_sums = np.zeros((len(CUBE_MEASURES), len(pairs), n_years), dtype=np.int64)
+        self.pair_sums[:, pair_rows, year_codes] = cube[CUBE_MEASURES].to_numpy(np.int64).T
+        self.pair_present = np.zeros((len(pairs), n_years), dtype=bool)
+        self.pair_present[pair_rows, year_codes] = True
+
+        # Partial sums by country and year, for the selections of all continents
+        self.country_sums = np.zeros((len(CUBE_MEASURES), n_countries, n_years), dtype=np.int64)
+        np.add.at(self.country_sums, (slice(None), self.pair_country), self.pair_sums)
+        self.country_present = np.zeros((n_countries, n_years), dtype=bool)
+        np.logical_or.at(self.country_present, self.pair_country, self.pair_present)
+
+        # Countries of each year and of all years, sorted by Total
+        self.year_rankings = [
+            self.rank_countries(self.country_sums[:, :, year], self.country_present[:, year])
+            for year in range(n_years)]
+        self.all_sums = self.country_sums.sum(axis=2)
+        self.all_present = self.country_present.any(axis=1)
+        self.all_ranking = self.rank_countries(self.all_sums, self.all_present)
+
+    def append(self, cube, delta_cube):
+        # Index of the cube with the rows of delta_cube appended (see append_cube). delta_cube
+        # only has years not loaded before: the partial sums are copied, only the rows of
+        # delta_cube are summed and only their years are ranked again
+        index = object.__new__(SummaryIndex)
+        index.countries = cube['País'].dtype
+        index.continents = cube['Continente'].cat.categories
+        index.years = cube['Ano'].cat.categories
+
+        country_codes = delta_cube['País'].cat.codes.to_numpy()
+        continent_codes = delta_cube['Continente'].cat.codes.to_numpy()
+        year_codes = delta_cube['Ano'].cat.codes.to_numpy()
+        measures = delta_cube[CUBE_MEASURES].to_numpy(np.int64).T
+        n_countries = len(index.countries.categories)
+        n_years = len(index.years)
+        n_previous_years = len(self.year_rankings)
+
+        # Pairs of the cube and of the new rows, the codes of the existing labels don't change
+        previous_pairs = self.pair_country * len(index.continents) + self.pair_continent
+        delta_pairs = country_codes.astype(np.int64) * len(index.continents) + continent_codes
+        pairs = np.union1d(previous_pairs, delta_pairs)
+        previous_rows = np.searchsorted(pairs, previous_pairs)
+        pair_rows = np.searchsorted(pairs, delta_pairs)
+        index.pair_country = pairs // len(index.continents)
+        index.pair_continent = pairs % len(index.continents)
+        index.pair_sums = np.zeros((len(CUBE_MEASURES), len(pairs), n_years), dtype=np.int64)
+        index.pair_sums[:, previous_rows, :n_previous_years] = self.pair_sums
+        index.pair_sums[:, pair_rows, year_codes] = measures
+        index.pair_present = np.zeros((len(pairs), n_years), dtype=bool)
+        index.pair_present[previous_rows, :n_previous_years] = self.pair_present
+        index.pair_present[pair_rows, year_codes] = True
+
+        # Partial sums by country, only the rows of delta_cube are added
+        index.country_sums = np.zeros((len(CUBE_MEASURES), n_countries, n_years), dtype=np.int64)
+        index.country_sums[:, :len(self.all_present), :n_previous_years] = self.country_sums
+        np.add.at(index.country_sums, (slice(None), country_codes, year_codes), measures)
+        index.country_present = np.zeros((n_countries, n_years), dtype=bool)
+        index.country_present[:len(self.all_present), :n_previous_years] = self.country_present
+        index.country_present[country_codes, year_codes] = True
+
+        # Rankings of the new years, the years loaded before keep theirs
+        index.year_rankings = self.year_rankings + [None] * (n_years - n_previous_years)
+        for year in np.unique(year_codes):
+            index.year_rankings[year] = index.rank_countries(
+                index.country_sums[:, :, year], index.country_present[:, year])
+        index.all_sums = np.zeros((len(CUBE_MEASURES), n_countries), dtype=np.int64)
+        index.all_sums[:, :len(self.all_present)] = self.all_sums
+        np.add.at(index.all_sums, (slice(None), country_codes), measures)
+        index.all_present = index.country_present.any(axis=1)
+        index.all_ranking = index.rank_countries(index.all_sums, index.all_present)
+        return index
+
+    @staticmethod
+    def rank_countries(sums, present):
+        # Codes of the countries present, by Total descending and then by code, as nlargest
+        # keeps the first of the tied countries of the roll up (sorted by code)
+        codes = np.flatnonzero(present)
+        return codes[np.lexsort((codes, -sums[-1, codes]))]
+
+    def get_year_codes(self, years):
+        if years is None:
+            return None
+        codes = self.years.get_indexer(list(years))
+        return np.unique(codes[codes >= 0])
+
+    def query(self, continent='Todos', country='Todos', years=None):
+        # Total, countries with the most tourists and average per year of the filtered cube,
+        # the same values as summarize(apply_filters(cube, continent, country, years))
+        year_codes = self.get_year_codes(years)
+        if continent == 'Todos' and country == 'Todos':
+            if year_codes is None:
+                sums, present, ranking = self.all_sums, self.all_present, self.all_ranking
+                years_present = self.country_present.any(axis=0)
+            elif len(year_codes) == 1:
+                year = year_codes[0]
+                sums, present = self.country_sums[:, :, year], self.country_present[:, year]
+                ranking = self.year_rankings[year]
+                years_present = present.any(keepdims=True)
+            else:
+                sums = self.country_sums[:, :, year_codes].sum(axis=2)
+                present = self.country_present[:, year_codes]
+                years_present = present.any(axis=0)
+                present = present.any(axis=1)
+                ranking = self.rank_countries(sums, present)
+        else:
+            # Only the pairs of the selected continent and country are merged
+            selected = np.ones(len(self.pair_country), dtype=bool)
+            if continent != 'Todos':
+                selected &= self.pair_continent == self.continents.get_indexer([continent])[0]
+            if country != 'Todos':
+                selected &= self.pair_country == self.countries.categories.get_indexer([country])[0]
+            pairs = np.flatnonzero(selected)
+            pair_sums = self.pair_sums[:, pairs]
+            pair_present = self.pair_present[pairs]
+            if year_codes is not None:
+                pair_sums = pair_sums[:, :, year_codes]
+                pair_present = pair_present[:, year_codes]
+            years_present = pair_present.any(axis=0)
+
+            # Roll up the selected pairs by country
+            codes, pair_countries = np.unique(self.pair_country[pairs], return_inverse=True)
+            country_sums = np.zeros((len(CUBE_MEASURES), len(codes)), dtype=np.int64)
+            np.add.at(country_sums, (slice(None), pair_countries), pair_sums.sum(axis=2))
+            country_present = np.zeros(len(codes), dtype=bool)
+            np.logical_or.at(country_present, pair_countries, pair_present.any(axis=1))
+            ranking = self.rank_countries(country_sums, country_present)
+            sums = np.zeros((len(CUBE_MEASURES), len(self.countries.categories)), dtype=np.int64)
+            sums[:, codes] = country_sums
+            ranking = codes[ranking]
+
+        # Countries not present have no tourists, so they don't change the total
+        total = sums[-1].sum()
+        top = ranking[:TOP_COUNTRIES]
+        most_tourists = pd.DataFrame(
+            {col: sums[i, top] for i, col in enumerate(CUBE_MEASURES)},
+            index=pd.CategoricalIndex(
+                pd.Categorical.from_codes(top, dtype=self.countries), name='País'))
+        return {
+            'total': total,
+            'most_tourists': most_tourists,
+            'average': total / max(int(np.count_nonzero(years_present)), 1)
+        }
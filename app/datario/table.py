@@ -0,0 +1,24 @@
+"""Sorting of the table rows from a rank precomputed once per dataset."""
+import numpy as np
+import pandas as pd
+
+
+def build_sort_rank(column):
+    # Position of each row of the dataset when sorted by the column
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Only the categories are compared, missing values go last
+        category_rank = column.cat.categories.argsort().argsort()
+        keys = np.append(category_rank, len(category_rank))[
+            column.cat.codes.to_numpy()]
+    else:
+        keys = column.to_numpy()
+    order = np.argsort(keys, kind='stable')
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank
+
+
+def get_sort_order(data, subset, rank):
+    # Order of the rows of a subset of the data, given the rank of the rows of the data
+    positions = data.index.get_indexer(subset.index)
+    return np.argsort(rank[positions], kind='stable')
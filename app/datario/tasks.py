@@ -0,0 +1,76 @@
+"""Thread pool for the work that should not block the Streamlit script thread."""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+TASK_WORKERS = 4
+
+
+class Task:
+    # Work running in a TaskPool, with the progress (from 0 to 1) reported by the work itself
+    # and the wall time of the work, set when it completes
+    def __init__(self):
+        self.future = None
+        self.progress = 0.0
+        self.seconds = None
+
+    def set_progress(self, value):
+        self.progress = value
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        # Raises the exception of the work, if it failed
+        return self.future.result()
+
+    def wait(self, timeout=None):
+        # Returns as soon as the task completes, or after the timeout
+        wait([self.future], timeout=timeout)
+        return self.future.done()
+
+
+def wait_any(tasks, timeout=None):
+    # Tasks completed when the first one completes, or after the timeout
+    futures = {task.future: task for task in tasks}
+    done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+    return [futures[future] for future in done]
+
+
+class TaskPool:
+    # Threads shared by all sessions. While a task submitted with a key is running,
+    # submitting the same key returns the running task instead of starting another.
+    def __init__(self, max_workers=TASK_WORKERS, name='datario-task'):
+        # The done callback may run while the lock is held, if the task is already done
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._running = {}
+
+    def submit(self, work, key=None):
+        # The work receives its task, to report the progress
+        with self._lock:
+            if key is not None and key in self._running:
+                return self._running[key]
+            task = Task()
+            task.future = self._executor.submit(self._run, work, task)
+            if key is not None:
+                self._running[key] = task
+                task.future.add_done_callback(lambda _: self._forget(key, task))
+            return task
+
+    def stats(self):
+        with self._lock:
+            return {'running': len(self._running)}
+
+    @staticmethod
+    def _run(work, task):
+        start = time.perf_counter()
+        try:
+            return work(task)
+        finally:
+            task.seconds = time.perf_counter() - start
+
+    def _forget(self, key, task):
+        with self._lock:
+            if self._running.get(key) is task:
+                del self._running[key]
@@ -0,0 +1,234 @@
+import os
+import sys
+import io
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+############## CONFIG ##############
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = ['1e3', '1e4', '1e5', '1e6']
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, 'benchmarks', 'baseline.json')
+
+# Slower than the baseline by more than this ratio is reported as a regression
+REGRESSION_RATIO = 1.2
+
+# The engine of the dashboard is headless, Streamlit is not imported
+sys.path.insert(0, os.path.join(ROOT_DIR, 'app'))
+import datario  # noqa: E402
+from datario import globe, figures  # noqa: E402
+
+
+############## SYNTHETIC DATA ##############
+
+# Months from 1990-01 to 2024-12
+PERIODS = np.array([f'{year}-{month:02d}' for year in range(1990, 2025) for month in range(1, 13)])
+
+def make_dataset(rows, seed=0):
+    # Monthly data shaped like total_continentes.csv, with more periods and more countries
+    # than the original. The months are the periods of the Ano column (e.g. 2016-01).
+    # Real countries come first so the globe merge has matches.
+    rng = np.random.default_rng(seed)
+    reference = pd.read_csv(os.path.join(ROOT_DIR, 'data', '02_processed', 'total_continentes.csv'))
+    countries = reference.drop_duplicates('País')[['País', 'Continente']]
+
+    # Grow the number of countries with the size of the dataset
+    extra = max(int(np.sqrt(rows)) - len(countries), 0)
+    continents = countries['Continente'].unique()
+    countries = pd.concat([countries, pd.DataFrame({
+        'País': [f'País {i:05d}' for i in range(extra)],
+        'Continente': rng.choice(continents, extra)
+    })], ignore_index=True)
+
+    picked = rng.integers(0, len(countries), rows)
+    air = rng.integers(0, 50_000, rows)
+    sea = rng.integers(0, 2_000, rows)
+    return pd.DataFrame({
+        'País': countries['País'].to_numpy()[picked],
+        'Continente': countries['Continente'].to_numpy()[picked],
+        'Aérea': air,
+        'Marítima': sea,
+        'Total': air + sea,
+        'Ano': PERIODS[rng.integers(0, len(PERIODS), rows)]
+    })
+
+
+############## OPERATIONS ##############
+
+def get_operations(raw, csv_bytes):
+    # Each operation mirrors a step the app runs for the Upload, Explorador and Editor views
+    data = datario.read_data_csv(io.BytesIO(csv_bytes), max_bytes=float('inf'), max_rows=float('inf'))
+    cube = datario.build_cube(data)
+    continent = data['Continente'].cat.categories[0]
+    years = data['Ano'].cat.categories[-5:].tolist()
+    filtered_cube = datario.apply_filters(cube, continent, 'Todos', years)
+    index = datario.build_search_index(data)
+    summary_index = datario.SummaryIndex(cube)
+
+    # The last year appended to the others, as the append mode of the Upload view does
+    last_year = data['Ano'].cat.categories[-1]
+    store = datario.DatasetStore()
+    history = store.acquire('history', lambda: datario.compact_dtypes(
+        raw.loc[raw['Ano'] != last_year, datario.REQUIRED_COLUMNS].reset_index(drop=True)))
+    history.get_derived('search_index', lambda: datario.build_search_index(history.data))
+    history.get_derived('chart_data', lambda: figures.build_chart_data(history.cube))
+    delta = raw.loc[raw['Ano'] == last_year, datario.REQUIRED_COLUMNS].reset_index(drop=True)
+
+    operations = {
+        'upload_parse': lambda: datario.read_data_csv(
+            io.BytesIO(csv_bytes), max_bytes=float('inf'), max_rows=float('inf')),
+        'set_data_coercion': lambda: datario.compact_dtypes(raw.copy()),
+        'validate_data': lambda: datario.validate_data(data),
+        'build_cube': lambda: datario.build_cube(data),
+        'filter_chain': lambda: (
+            datario.apply_filters(data, continent)['País'].unique(),
+            datario.apply_filters(data, continent, 'Todos', years)),
+        'groupby_country': lambda: datario.rollup_cube(filtered_cube, 'País'),
+        'groupby_year': lambda: datario.rollup_cube(filtered_cube, 'Ano'),
+        'groupby_year_continent': lambda: datario.rollup_cube(filtered_cube, ['Ano', 'Continente']),
+        'summary_index_build': lambda: datario.SummaryIndex(cube),
+        'summary_index_query': lambda: summary_index.query(continent, 'Todos', years),
+        'top_countries': lambda: datario.rollup_cube(
+            filtered_cube, 'País').set_index('País').nlargest(5, 'Total'),
+        'search_index': lambda: datario.build_search_index(data),
+        'editor_search': lambda: datario.search_data(data, index, 'fran'),
+        'csv_export': lambda: datario.encode_data(data, 'CSV'),
+        'parquet_export': lambda: datario.encode_data(data, 'Parquet'),
+        'globe_merge': lambda: globe.build_globe_data(cube),
+        'append_year': lambda: store.append(history, delta),
+        'format_numbers': lambda: datario.format_numbers(data['Total'])
+    }
+
+    # The filter and group by of each query backend installed, over the raw rows
+    for name in datario.get_available_backends():
+        backend = datario.create_backend(name, data, cube)
+        operations[f'{name}_filter_rows'] = (
+            lambda backend=backend: backend.filter_rows(continent, 'Todos', years))
+        operations[f'{name}_filter_cube'] = (
+            lambda backend=backend: backend.filter_cube(continent, 'Todos', years))
+    return operations
+
+
+def measure(operation, repeat):
+    # Best wall time of a few runs, and the peak memory allocated by one run
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def run(sizes, repeat, only=None):
+    results = []
+    for size in sizes:
+        rows = int(float(size))
+        raw = make_dataset(rows)
+        csv_bytes = raw.to_csv(index=False).encode()
+        for name, operation in get_operations(raw, csv_bytes).items():
+            if only and name not in only:
+                continue
+            seconds, peak = measure(operation, repeat)
+            results.append({
+                'rows': rows,
+                'operation': name,
+                'seconds': round(seconds, 6),
+                'rows_per_second': round(rows / seconds) if seconds else None,
+                'peak_mb': round(peak / 1024 ** 2, 3)
+            })
+            print(format_result(results[-1]), flush=True)
+    return results
+
+
+############## BASELINE ##############
+
+def get_result_key(result):
+    return f"{result['rows']}:{result['operation']}"
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as file:
+        json.dump({get_result_key(result): result for result in results}, file, indent=2)
+
+
+def compare(results, baseline):
+    # Ratio of each time to the baseline, above REGRESSION_RATIO is a regression
+    regressions = []
+    for result in results:
+        reference = baseline.get(get_result_key(result))
+        if not reference:
+            continue
+        ratio = result['seconds'] / max(reference['seconds'], 1e-9)
+        result['baseline_ratio'] = round(ratio, 3)
+        if ratio > REGRESSION_RATIO:
+            regressions.append(result)
+    return regressions
+
+
+def format_result(result):
+    line = (f"{result['rows']:>10,} rows  {result['operation']:<24} "
+            f"{result['seconds'] * 1000:>10.2f} ms  "
+            f"{(result['rows_per_second'] or 0):>14,} rows/s  {result['peak_mb']:>9.2f} MB")
+    if 'baseline_ratio' in result:
+        line += f"  x{result['baseline_ratio']:.2f} vs baseline"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the data operations of the dashboard with synthetic datasets.')
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES,
+                        help='number of rows of each dataset, e.g. 1e3 1e5 1e7')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs of each operation, the best time is kept')
+    parser.add_argument('--only', nargs='+', help='run only these operations')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='JSON file with the results to compare against')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--output', help='append the results to this JSON lines file')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.only)
+
+    regressions = compare(results, load_baseline(args.baseline))
+    if any('baseline_ratio' in result for result in results):
+        print('\nComparison with the baseline:')
+        for result in results:
+            print(format_result(result))
+    if regressions:
+        print(f'\n{len(regressions)} operation(s) slower than {REGRESSION_RATIO}x the baseline:')
+        for result in regressions:
+            print(format_result(result))
+
+    if args.output:
+        with open(args.output, 'a') as file:
+            file.writelines(json.dumps(result) + '\n' for result in results)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f'\nBaseline saved to {args.baseline}')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
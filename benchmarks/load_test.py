@@ -0,0 +1,370 @@
+import os
+import sys
+import io
+import gc
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+############## CONFIG ##############
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILE = os.path.join(ROOT_DIR, 'app', 'app.py')
+DATA_FILE = os.path.join(ROOT_DIR, 'data', '02_processed', 'total_continentes.csv')
+DEFAULT_SESSIONS = [1, 2, 4, 8]
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, 'benchmarks', 'load_baseline.json')
+
+# Longest a single rerun may take, the upload of a large file included
+RUN_TIMEOUT = 300
+
+# A p95 slower than the baseline by more than this ratio is reported as a regression
+REGRESSION_RATIO = 1.2
+
+# Searches typed in the Editor
+SEARCHES = ['fran', 'am', 'ale', 'europa', 'bra', '20']
+
+# Each session runs the app in a process of its own: AppTest mocks a Runtime global to the
+# process, so sessions running in threads of the same process break each other's reruns.
+# The dataset store, the task pools and the figure cache are not shared by the sessions,
+# the memory of a session is what a server holding only that session would use.
+sys.path.insert(0, os.path.join(ROOT_DIR, 'app'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'benchmarks'))
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+
+############## SIMULATED UPLOADS ##############
+
+# AppTest can't upload files, so st.file_uploader is replaced by one returning the file
+# set in the session state of each simulated session. Other uploaders (e.g. the append
+# mode) stay empty.
+UPLOAD_STATE_KEY = 'load_test_upload'
+
+
+class SimulatedUpload(io.BytesIO):
+    # The attributes of a Streamlit UploadedFile used by the app
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            super().__init__(file.read())
+        self.name = os.path.basename(path)
+        self.file_id = path
+
+
+def simulated_file_uploader(label, *args, key=None, **kwargs):
+    path = st.session_state.get(UPLOAD_STATE_KEY)
+    if key is not None or path is None:
+        return None
+    return SimulatedUpload(path)
+
+
+def make_upload_files(directory, sessions, rows, unique):
+    # The file uploaded by each session: the DataRio data, or synthetic datasets
+    # (one per session with unique, so the sessions don't share their dataset)
+    if rows is None and not unique:
+        return [DATA_FILE] * sessions
+    from bench import make_dataset
+
+    paths = []
+    for session in range(sessions if unique else 1):
+        path = os.path.join(directory, f'dataset_{rows}_{session}.csv')
+        if not os.path.exists(path):
+            make_dataset(rows or 10_000, seed=session).to_csv(path, index=False)
+        paths.append(path)
+    return paths if unique else paths * sessions
+
+
+############## FLOWS ##############
+
+def get_widget(widgets, label):
+    return next(widget for widget in widgets if widget.label == label)
+
+
+def pick(rng, options, current):
+    # Another option than the current one, if there is one
+    others = [option for option in options if option != current]
+    return rng.choice(others) if others else current
+
+
+def get_flow(rounds, rng):
+    # Steps of a session, each one a widget change followed by a rerun: the upload,
+    # then rounds of Explorador filters and chart sections, Editor searches and exports
+    def upload(at):
+        at.run()
+
+    def open_explore(at):
+        at.sidebar.radio[0].set_value('Explorar').run()
+
+    def select_view(view):
+        def step(at):
+            get_widget(at.selectbox, 'Opções de Visualização').set_value(view).run()
+        return step
+
+    def filter_continent(at):
+        widget = get_widget(at.selectbox, 'Continente')
+        widget.set_value(pick(rng, widget.options, widget.value)).run()
+
+    def filter_country(at):
+        widget = get_widget(at.selectbox, 'País')
+        widget.set_value(pick(rng, widget.options, widget.value)).run()
+
+    def filter_years(at):
+        widget = get_widget(at.multiselect, 'Ano')
+        options = widget.options
+        widget.set_value(rng.sample(options, rng.randint(1, len(options)))).run()
+
+    def clear_filters(at):
+        get_widget(at.selectbox, 'Continente').set_value('Todos').run()
+
+    def chart_section(at):
+        widget = at.radio(key='current_chart_section')
+        widget.set_value(pick(rng, widget.options, widget.value)).run()
+
+    def editor_search(at):
+        at.text_input[0].set_value(rng.choice(SEARCHES)).run()
+
+    def editor_download(at):
+        # The file is serialized when the format changes
+        widget = get_widget(at.radio, 'Formato')
+        widget.set_value(pick(rng, widget.options, widget.value)).run()
+
+    steps = [('upload', upload), ('open_explore', open_explore)]
+    for _ in range(rounds):
+        steps += [
+            ('explorador_continent', filter_continent),
+            ('explorador_country', filter_country),
+            ('explorador_years', filter_years),
+            ('explorador_chart', chart_section),
+            ('explorador_clear', clear_filters),
+            ('editor_open', select_view('Editor')),
+            ('editor_search', editor_search),
+            ('editor_download', editor_download),
+            ('explorador_open', select_view('Explorador'))
+        ]
+    return steps
+
+
+def init_session_process(catalog_dir, warmup):
+    # Runs once in each session process, before its session starts
+    st.file_uploader = simulated_file_uploader
+    os.chdir(ROOT_DIR)
+    # The uploads of the sessions are not saved in the catalog of the dashboard
+    os.environ['DASHBOARD_CATALOG_DIR'] = catalog_dir
+    if warmup:
+        # The imports of the app and the first use of its libraries are not part of the
+        # measures. AppTest runs the app as the __main__ module, the session is then read
+        # from this module again.
+        main = sys.modules['__main__']
+        run_session(-1, DATA_FILE, 1)
+        sys.modules['__main__'] = main
+
+
+def run_session(session, upload_file, rounds, start=None):
+    # Drive one simulated session through its flow, timing each rerun. The memory the
+    # session holds is measured at its end, while it is still open.
+    rng = random.Random(session)
+    at = AppTest.from_file(APP_FILE, default_timeout=RUN_TIMEOUT)
+    at.session_state[UPLOAD_STATE_KEY] = upload_file
+    records = []
+    gc.collect()
+    rss_before = get_rss_mb()
+    if start is not None:
+        start.wait()
+    for step, action in get_flow(rounds, rng):
+        began = time.perf_counter()
+        try:
+            action(at)
+            error = at.exception[0].message if at.exception else None
+        except Exception as exception:
+            # e.g. a widget missing because the previous rerun failed
+            error = repr(exception)
+        records.append({'session': session, 'step': step,
+                        'ms': (time.perf_counter() - began) * 1000, 'error': error})
+        if error:
+            break
+    gc.collect()
+    return records, rss_before, get_rss_mb()
+
+
+############## MEASUREMENTS ##############
+
+def get_rss_mb():
+    # Resident memory of the process, from /proc on Linux or the peak elsewhere
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** (2 if sys.platform == 'darwin' else 1)
+
+
+def get_percentiles(values):
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (0, 0, 0)
+    return {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
+
+
+def run_level(sessions, upload_files, rounds, catalog_dir, warmup=True):
+    # Run the sessions at the same time, each one in its own process. The processes are
+    # started and warmed up before the sessions start together.
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager, ProcessPoolExecutor(
+            max_workers=sessions, mp_context=context, initializer=init_session_process,
+            initargs=(catalog_dir, warmup)) as executor:
+        start = manager.Barrier(sessions + 1)
+        futures = [executor.submit(run_session, session, upload_files[session], rounds, start)
+                   for session in range(sessions)]
+        try:
+            start.wait(RUN_TIMEOUT)
+        except threading.BrokenBarrierError:
+            # A session process failed before its session started
+            for future in futures:
+                if future.done():
+                    future.result()
+            raise
+        began = time.perf_counter()
+        results = [future.result() for future in futures]
+        seconds = time.perf_counter() - began
+
+    records = [record for session_records, _, _ in results for record in session_records]
+    latencies = [record['ms'] for record in records]
+    result = {
+        'sessions': sessions,
+        'reruns': len(records),
+        'errors': sum(1 for record in records if record['error']),
+        **get_percentiles(latencies),
+        'reruns_per_second': round(len(records) / seconds, 2),
+        'mb_per_session': round(np.mean([
+            max(after - before, 0) for _, before, after in results]), 2),
+        'rss_mb': round(np.mean([after for _, _, after in results]), 1),
+        'steps': {
+            step: get_percentiles([record['ms'] for record in records if record['step'] == step])
+            for step in dict.fromkeys(record['step'] for record in records)
+        }
+    }
+    errors = [record for record in records if record['error']]
+    del results
+    return result, errors
+
+
+def run(levels, rounds, rows=None, unique=False, warmup=True):
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_dir = os.path.join(directory, 'catalog')
+        results = []
+        for sessions in levels:
+            result, errors = run_level(
+                sessions, make_upload_files(directory, sessions, rows, unique), rounds,
+                catalog_dir, warmup)
+            results.append(result)
+            print(format_result(result), flush=True)
+            for error in errors[:3]:
+                print(f"    session {error['session']} failed at {error['step']}: {error['error']}")
+    return results
+
+
+############## BASELINE ##############
+
+def get_step_keys(result):
+    # p95 of each step and of all the reruns, by number of sessions
+    keys = {f"{result['sessions']}:all": result['p95_ms']}
+    for step, percentiles in result['steps'].items():
+        keys[f"{result['sessions']}:{step}"] = percentiles['p95_ms']
+    return keys
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    baseline = {}
+    for result in results:
+        baseline.update(get_step_keys(result))
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2)
+
+
+def compare(results, baseline):
+    # Steps whose p95 is slower than REGRESSION_RATIO times the baseline
+    regressions = []
+    for result in results:
+        for key, p95 in get_step_keys(result).items():
+            reference = baseline.get(key)
+            if reference and p95 / max(reference, 1e-9) > REGRESSION_RATIO:
+                regressions.append((key, p95, reference))
+    return regressions
+
+
+def format_result(result):
+    return (f"{result['sessions']:>4} sessions  {result['reruns']:>6} reruns  "
+            f"p50 {result['p50_ms']:>9.1f} ms  p95 {result['p95_ms']:>9.1f} ms  "
+            f"p99 {result['p99_ms']:>9.1f} ms  {result['reruns_per_second']:>8.2f} reruns/s  "
+            f"{result['mb_per_session']:>8.2f} MB/session  errors {result['errors']}")
+
+
+def format_steps(result):
+    lines = [f"  {'step':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for step, percentiles in result['steps'].items():
+        lines.append(f"  {step:<24}{percentiles['p50_ms']:>10.1f}"
+                     f"{percentiles['p95_ms']:>10.1f}{percentiles['p99_ms']:>10.1f}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load test the dashboard with concurrent simulated sessions.')
+    parser.add_argument('--sessions', nargs='+', type=int, default=DEFAULT_SESSIONS,
+                        help='numbers of concurrent sessions to run, one level after the other')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='rounds of Explorador and Editor steps of each session')
+    parser.add_argument('--rows', type=int,
+                        help='upload synthetic datasets with this number of rows '
+                             'instead of the DataRio data')
+    parser.add_argument('--unique-data', action='store_true',
+                        help='each session uploads a different dataset, nothing is shared')
+    parser.add_argument('--no-warmup', action='store_true',
+                        help="don't run the app once in each session process before the "
+                             'sessions start, the imports are measured too')
+    parser.add_argument('--steps', action='store_true',
+                        help='print the percentiles of each step')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='JSON file with the p95 of each step to compare against')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--output', help='append the results to this JSON lines file')
+    args = parser.parse_args()
+
+    results = run(args.sessions, args.rounds, args.rows, args.unique_data,
+                  warmup=not args.no_warmup)
+    if args.steps:
+        for result in results:
+            print(f"\n{result['sessions']} sessions:")
+            print(format_steps(result))
+
+    regressions = compare(results, load_baseline(args.baseline))
+    if regressions:
+        print(f'\n{len(regressions)} p95 latencies slower than {REGRESSION_RATIO}x the baseline:')
+        for key, p95, reference in regressions:
+            print(f'  {key:<32} {p95:>9.1f} ms  (baseline {reference:.1f} ms)')
+
+    if args.output:
+        with open(args.output, 'a') as file:
+            file.writelines(json.dumps(result) + '\n' for result in results)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f'\nBaseline saved to {args.baseline}')
+
+    failed = any(result['errors'] for result in results)
+    return 1 if regressions or failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
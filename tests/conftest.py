@@ -0,0 +1,54 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The engine of the dashboard is headless, the tests import it without Streamlit
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'app'))
+
+from datario import validate_data  # noqa: E402
+
+CONTINENTS = {
+    'Europa': ['França', 'Alemanha', 'Itália', 'Portugal', 'Espanha'],
+    'América do Sul': ['Argentina', 'Chile', 'Uruguai', 'Paraguai'],
+    'Ásia': ['Japão', 'China', 'Índia'],
+    'África': ['Angola', 'Egito']
+}
+YEARS = ['2015', '2016', '2017', '2018', '2019']
+
+
+def make_data(rows=400, years=YEARS, seed=0):
+    # Rows shaped like total_continentes.csv, with repeated keys and small counts so that
+    # many countries are tied on their totals. Validated as the DatasetStore does.
+    rng = np.random.default_rng(seed)
+    countries = [(country, continent)
+                 for continent, names in CONTINENTS.items() for country in names]
+    picked = rng.integers(0, len(countries), rows)
+    air = rng.integers(0, 4, rows)
+    sea = rng.integers(0, 3, rows)
+    data = pd.DataFrame({
+        'País': [countries[i][0] for i in picked],
+        'Continente': [countries[i][1] for i in picked],
+        'Aérea': air,
+        'Marítima': sea,
+        'Total': air + sea,
+        'Ano': np.asarray(years)[rng.integers(0, len(years), rows)]
+    })
+    return validate_data(data)[0]
+
+
+def get_filter_combinations(data):
+    # Filters of the Explorador: each continent, some countries and sets of years,
+    # including a country of another continent and a year not in the data
+    continents = ['Todos'] + data['Continente'].cat.categories.tolist()
+    countries = ['Todos', 'França', 'Chile', 'Japão']
+    years = [None, ('2016',), ('2015', '2019'), ('2017', '2030'), ('2030',)]
+    return [(continent, country, selected)
+            for continent in continents for country in countries for selected in years]
+
+
+@pytest.fixture
+def data():
+    return make_data()
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from datario import (build_cube, append_rows, append_cube, build_search_index, search_data,
+                     append_search_index, validate_data)
+from datario.figures import build_chart_data, append_chart_data
+from conftest import make_data
+
+
+@pytest.fixture
+def appended():
+    # Loaded years, then new years with a country and a continent not loaded before
+    history = make_data(years=['2015', '2016', '2017'], seed=1)
+    delta = make_data(rows=150, years=['2018', '2019'], seed=2)
+    delta = delta.astype({'País': str, 'Continente': str})
+    delta.loc[0, ['País', 'Continente']] = ['Canadá', 'América do Norte']
+    data, delta = append_rows(history, validate_data(delta)[0])
+    return history, delta, data
+
+
+def test_append_rows_keeps_the_codes_of_the_loaded_rows(appended):
+    history, _, data = appended
+    for col in ['País', 'Continente', 'Ano']:
+        assert (data[col].cat.codes[:len(history)].to_numpy() ==
+                history[col].cat.codes.to_numpy()).all()
+        assert data[col].astype(str).tolist()[:len(history)] == history[col].astype(str).tolist()
+
+
+def test_append_rows_rejects_loaded_years(appended):
+    history, _, _ = appended
+    with pytest.raises(ValueError):
+        append_rows(history, make_data(rows=10, years=['2017', '2018']))
+
+
+def test_append_rows_rejects_older_years():
+    # An older year would be added after the loaded years, out of order
+    history = make_data(years=['2017', '2018', '2019'], seed=1)
+    with pytest.raises(ValueError, match='2016'):
+        append_rows(history, make_data(rows=10, years=['2016']))
+    with pytest.raises(ValueError, match='2016'):
+        append_rows(history, make_data(rows=10, years=['2016', '2020']))
+
+
+def test_append_cube_matches_rebuilt_cube(appended):
+    history, delta, data = appended
+    cube = append_cube(build_cube(history), build_cube(delta))
+    pd.testing.assert_frame_equal(cube, build_cube(data))
+
+
+def test_append_chart_data_matches_rebuilt_data(appended):
+    history, delta, data = appended
+    chart_data = append_chart_data(build_chart_data(build_cube(history)), build_cube(delta))
+    expected = build_chart_data(build_cube(data))
+    for chart, chart_expected in expected.items():
+        if isinstance(chart_expected, pd.DataFrame):
+            pd.testing.assert_frame_equal(
+                chart_data[chart].reset_index(drop=True), chart_expected.reset_index(drop=True),
+                check_categorical=False, check_dtype=False)
+
+
+def test_append_search_index_matches_rebuilt_index(appended):
+    history, delta, data = appended
+    index = append_search_index(build_search_index(history), data, delta)
+    expected = build_search_index(data)
+    for query in ['fran', 'america', 'canada', '2018', '1', 'ê', 'xyz']:
+        assert (search_data(data, index, query) == search_data(data, expected, query)).all()
@@ -0,0 +1,131 @@
+import os
+import pandas as pd
+import pytest
+
+from datario import DatasetCatalog, DatasetStore, SummaryIndex, build_cube
+from datario.catalog import is_owner, is_visible, write_table
+from conftest import make_data
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return DatasetCatalog(str(tmp_path), max_datasets=3, max_owner_datasets=2)
+
+
+def get_keys(catalog, owner=None):
+    return sorted(entry['key'] for entry in catalog.list_datasets(owner))
+
+
+def save(catalog, key, owner=None, rows=50):
+    # Entries saved in the same second are ordered by their creation, as in the catalog
+    entry = catalog.save_dataset(key, make_data(rows=rows), key, owner=owner)
+    entries = catalog._read_index()
+    entries[key]['created'] = f'2024-01-01T00:00:{len(entries):02d}'
+    catalog._write_index(entries)
+    return entry
+
+
+def test_open_saved_dataset(catalog):
+    data = make_data()
+    catalog.save_dataset('a', data, 'a')
+    pd.testing.assert_frame_equal(catalog.open_dataset('a'), data)
+    with pytest.raises(ValueError):
+        catalog.open_dataset('b')
+
+
+def test_open_saved_cube(catalog):
+    # The cube is reloaded as saved, the counts pointing to the memory-mapped file
+    data = make_data()
+    cube = build_cube(data)
+    catalog.save_dataset('a', data, 'a', cube=cube)
+    catalog.save_dataset('b', data.head(10), 'b')
+    pd.testing.assert_frame_equal(catalog.open_cube('a'), cube)
+    assert catalog.open_cube('b') is None
+
+    dataset = DatasetStore().acquire(
+        'a', lambda: catalog.open_dataset('a'), validate=False,
+        load_cube=lambda: catalog.open_cube('a'))
+    assert not dataset.cube['Total'].to_numpy().flags.owndata
+    index = dataset.get_derived('summary_index', None)
+    assert index.query('Europa')['total'] == SummaryIndex(cube).query('Europa')['total']
+
+    # The cube file is removed with the dataset
+    catalog.remove_dataset('a')
+    assert not os.path.exists(catalog.get_cube_path('a'))
+
+
+def test_datasets_are_listed_for_their_owners(catalog):
+    save(catalog, 'shared')
+    save(catalog, 'a', owner='user:ana')
+    save(catalog, 'b', owner='user:bruno')
+    assert get_keys(catalog, 'user:ana') == ['a', 'shared']
+    assert get_keys(catalog, 'user:bruno') == ['b', 'shared']
+    assert get_keys(catalog) == ['a', 'b', 'shared']
+
+    # The same data saved by another owner is listed for both
+    save(catalog, 'a', owner='user:bruno')
+    assert get_keys(catalog, 'user:bruno') == ['a', 'b', 'shared']
+    entry = catalog._read_index()['a']
+    assert is_owner(entry, 'user:ana') and is_owner(entry, 'user:bruno')
+    assert is_visible(catalog._read_index()['shared'], 'user:carla')
+    assert not is_owner(catalog._read_index()['shared'], 'user:carla')
+
+
+def test_only_owners_remove_datasets(catalog):
+    save(catalog, 'shared')
+    save(catalog, 'a', owner='user:ana')
+    save(catalog, 'a', owner='user:bruno')
+    assert not catalog.remove_dataset('shared', 'user:ana')
+    assert not catalog.remove_dataset('a', 'user:carla')
+
+    # The file is kept until the last owner removes it
+    assert catalog.remove_dataset('a', 'user:ana')
+    assert get_keys(catalog, 'user:ana') == ['shared']
+    assert os.path.exists(catalog.get_path('a'))
+    assert catalog.remove_dataset('a', 'user:bruno')
+    assert not os.path.exists(catalog.get_path('a'))
+
+    assert catalog.remove_dataset('shared')
+    assert get_keys(catalog) == []
+
+
+def test_oldest_datasets_are_evicted(catalog):
+    for key in ['a', 'b', 'c', 'd']:
+        save(catalog, key)
+    assert get_keys(catalog) == ['b', 'c', 'd']
+    assert not os.path.exists(catalog.get_path('a'))
+
+
+def test_oldest_datasets_of_an_owner_are_evicted(catalog):
+    save(catalog, 'a', owner='user:ana')
+    save(catalog, 'b', owner='user:ana')
+    save(catalog, 'c', owner='user:bruno')
+    save(catalog, 'c', owner='user:ana')
+    assert get_keys(catalog, 'user:ana') == ['b', 'c']
+    assert get_keys(catalog, 'user:bruno') == ['c']
+
+
+def test_catalog_size_is_bounded(tmp_path):
+    catalog = DatasetCatalog(str(tmp_path))
+    save(catalog, 'a', rows=2000)
+    catalog.max_bytes = catalog._read_index()['a']['bytes'] * 1.5
+    save(catalog, 'b', rows=2000)
+    assert get_keys(catalog) == ['b']
+
+    # A dataset larger than the whole catalog is not saved
+    assert catalog.save_dataset('c', make_data(rows=20000), 'c') is None
+    assert get_keys(catalog) == ['b']
+
+
+def test_dataset_saved_in_the_meantime(catalog, monkeypatch):
+    # Another session saves the same dataset while the file is being written
+    def write_and_save(path, table):
+        write_table(path, table)
+        monkeypatch.setattr('datario.catalog.write_table', write_table)
+        catalog.save_dataset('a', make_data(), 'a', owner='user:bruno')
+
+    monkeypatch.setattr('datario.catalog.write_table', write_and_save)
+    catalog.save_dataset('a', make_data(), 'a', owner='user:ana')
+    assert get_keys(catalog, 'user:ana') == ['a']
+    assert get_keys(catalog, 'user:bruno') == ['a']
+    assert not [name for name in os.listdir(catalog.directory) if name.endswith('.tmp')]
@@ -0,0 +1,36 @@
+import io
+import pandas as pd
+
+from datario import encode_data, read_data_csv, read_data_parquet, ExportCache
+
+
+def test_encoded_files_are_read_back(data):
+    csv = encode_data(data, 'CSV')
+    pd.testing.assert_frame_equal(read_data_csv(io.BytesIO(csv.encode())), data, check_dtype=False)
+    parquet = encode_data(data, 'Parquet')
+    pd.testing.assert_frame_equal(read_data_parquet(io.BytesIO(parquet)), data, check_dtype=False)
+
+
+def test_export_cache_serializes_each_selection_once(data):
+    cache = ExportCache()
+    first = cache.get(('a', 'CSV'), data, 'CSV')
+    assert cache.get(('a', 'CSV'), data.head(0), 'CSV') is first
+    assert isinstance(cache.get(('a', 'Parquet'), data, 'Parquet'), bytes)
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'size': 2,
+                             'bytes': len(first) + len(encode_data(data, 'Parquet'))}
+
+
+def test_export_cache_limits(data):
+    size = len(encode_data(data, 'CSV'))
+    cache = ExportCache(max_entries=2, max_bytes=size * 2)
+    for key in ['a', 'b', 'c']:
+        cache.get(key, data, 'CSV')
+    assert cache.stats()['size'] == 2
+    cache.get('b', data, 'CSV')
+    assert cache.stats()['hits'] == 1
+
+    # The oldest files are dropped over the size limit, a file over it is not kept
+    cache.get('d', pd.concat([data, data.head(10)]), 'CSV')
+    assert cache.stats()['size'] == 1
+    cache.get('e', pd.concat([data] * 3), 'CSV')
+    assert cache.stats()['size'] == 1 and cache.stats()['bytes'] <= size * 2
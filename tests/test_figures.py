@@ -0,0 +1,70 @@
+import pandas as pd
+
+from datario import build_cube, rollup_cube
+from datario.figures import limit_categories, bucket_years, get_others_label
+from conftest import make_data
+
+
+def get_totals(data, column):
+    return data.groupby(column, observed=True)['Total'].sum().to_dict()
+
+
+def test_limit_categories(data):
+    countries = rollup_cube(build_cube(data), 'País')
+    assert limit_categories(countries, 'País', len(countries)) is countries
+
+    limited = limit_categories(countries, 'País', 5)
+    kept = countries.nlargest(4, 'Total')
+    assert limited['País'].tolist() == [
+        country for country in countries['País'] if country in set(kept['País'])] + ['Outros']
+    assert limited['Total'].tolist()[:4] == kept.set_index('País').loc[
+        limited['País'][:4], 'Total'].tolist()
+    assert limited['Total'].sum() == countries['Total'].sum()
+    assert limited['Aérea'].sum() == countries['Aérea'].sum()
+
+
+def test_limit_categories_of_each_series(data):
+    # The other continents are summed in each year
+    continents = rollup_cube(build_cube(data), ['Ano', 'Continente'])
+    limited = limit_categories(continents, 'Continente', 2)
+    assert set(limited['Continente']) == {
+        continents.groupby('Continente', observed=True)['Total'].sum().idxmax(), 'Outros'}
+    assert get_totals(limited, 'Ano') == get_totals(continents, 'Ano')
+    assert not limited.duplicated(['Ano', 'Continente']).any()
+
+
+def test_others_label_of_data_with_outros():
+    assert get_others_label(['França', 'Chile']) == 'Outros'
+    assert get_others_label(['Outros', 'Outros*']) == 'Outros**'
+
+    # A country named Outros is kept apart from the other countries summed
+    countries = pd.DataFrame({
+        'País': ['Outros', 'França', 'Chile', 'Japão'],
+        'Aérea': [5, 9, 1, 2], 'Marítima': [0, 0, 0, 0], 'Total': [5, 9, 1, 2]})
+    limited = limit_categories(countries, 'País', 3)
+    assert limited.set_index('País')['Total'].to_dict() == {'Outros': 5, 'França': 9, 'Outros*': 3}
+
+
+def test_bucket_years():
+    data = make_data(rows=2000, years=[str(year) for year in range(1990, 2020)])
+    years = rollup_cube(build_cube(data), ['Ano', 'Continente'])
+    assert bucket_years(years, len(years)) is years
+
+    # 30 years of 4 continents in 40 points: buckets of 3 years
+    bucketed = bucket_years(years, 40)
+    assert bucketed['Ano'].cat.categories.tolist() == [
+        f'{year}–{year + 2}' for year in range(1990, 2020, 3)]
+    assert len(bucketed) <= 40
+    assert get_totals(bucketed, 'Continente') == get_totals(years, 'Continente')
+    first = years[years['Ano'].isin(['1990', '1991', '1992'])]
+    assert bucketed[bucketed['Ano'] == '1990–1992']['Total'].sum() == first['Total'].sum()
+
+
+def test_bucket_years_in_the_order_of_the_periods():
+    # Periods that are not categorical are bucketed in their sorted order
+    data = pd.DataFrame({
+        'Ano': ['2016-02', '2016-01', '2017-01', '2016-03'],
+        'Aérea': [1, 2, 3, 4], 'Marítima': [0, 0, 0, 0], 'Total': [1, 2, 3, 4]})
+    bucketed = bucket_years(data, 2)
+    assert bucketed['Ano'].tolist() == ['2016-01–2016-02', '2016-03–2017-01']
+    assert bucketed['Total'].tolist() == [3, 7]
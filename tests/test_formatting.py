@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from datario import format_number, format_numbers
+
+
+def format_plain(number):
+    # The pt-BR format of locale.format_string('%d', number, grouping=True)
+    return f'{int(number):,}'.replace(',', '.')
+
+
+def test_format_numbers_matches_each_number():
+    rng = np.random.default_rng(0)
+    numbers = np.concatenate([
+        rng.integers(-10 ** 12, 10 ** 12, 2000),
+        [0, 1, -1, 999, 1000, -1000, 999_999, 1_000_000,
+         np.iinfo(np.int64).max, np.iinfo(np.int64).min]
+    ])
+    formatted = format_numbers(numbers)
+    assert formatted.tolist() == [format_plain(number) for number in numbers]
+    assert formatted.tolist() == [format_number(number) for number in numbers]
+
+
+def test_format_numbers_keeps_the_series():
+    series = pd.Series([1234, None, 5.9, -7000.2], index=[3, 1, 2, 0], name='Total')
+    formatted = format_numbers(series)
+    assert formatted.tolist() == ['1.234', '', '5', '-7.000']
+    assert formatted.index.tolist() == [3, 1, 2, 0]
+    assert formatted.name == 'Total'
+
+
+def test_format_numbers_small_unsigned_counts():
+    counts = pd.Series(np.array([0, 255, 65_535, 4_000_000_000], dtype=np.uint32))
+    assert format_numbers(counts).tolist() == ['0', '255', '65.535', '4.000.000.000']
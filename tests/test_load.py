@@ -0,0 +1,86 @@
+import io
+import pandas as pd
+import pytest
+
+from datario import read_data_csv, read_data_parquet, read_data_file
+from conftest import make_data
+
+
+def to_csv(data):
+    return io.BytesIO(data.to_csv(index=False).encode())
+
+
+def to_parquet(data):
+    file = io.BytesIO()
+    data.to_parquet(file, index=False)
+    file.seek(0)
+    return file
+
+
+def get_labels(data):
+    return data.astype({col: str for col in ['País', 'Continente', 'Ano']})
+
+
+@pytest.mark.parametrize('to_file, read', [(to_csv, read_data_csv), (to_parquet, read_data_parquet)])
+def test_read_in_chunks(data, to_file, read):
+    # The chunks are merged with the categories of all of them. The progress of a CSV
+    # is estimated from its first lines, it may end a little before 1.
+    progress = []
+    read_data = read(to_file(get_labels(data)), chunk_rows=60, progress=progress.append)
+    pd.testing.assert_frame_equal(get_labels(read_data), get_labels(data), check_dtype=False)
+    assert isinstance(read_data['País'].dtype, pd.CategoricalDtype)
+    assert pd.api.types.is_unsigned_integer_dtype(read_data['Total'].dtype)
+    assert progress == sorted(progress) and 0.9 < progress[-1] <= 1.0
+
+
+@pytest.mark.parametrize('to_file, read', [(to_csv, read_data_csv), (to_parquet, read_data_parquet)])
+def test_budgets(data, to_file, read):
+    file = to_file(get_labels(data))
+    size = len(file.getvalue())
+    with pytest.raises(ValueError, match='MB'):
+        read(file, max_bytes=size - 1)
+    with pytest.raises(ValueError, match='linhas'):
+        read(file, max_rows=len(data) - 1, chunk_rows=60)
+    assert len(read(file, max_bytes=size, max_rows=len(data))) == len(data)
+    with pytest.raises(ValueError, match='Marítima'):
+        read(to_file(data.drop(columns='Marítima')))
+    with pytest.raises(ValueError, match='não possui dados'):
+        read(to_file(get_labels(data).head(0)))
+
+
+def test_csv_rows_over_the_limit_are_not_parsed(data):
+    # The file is rejected on the first chunk over the limit, before the rest is parsed
+    csv = data.to_csv(index=False) + 'França,Europa,"x\n'
+    with pytest.raises(ValueError, match='linhas'):
+        read_data_csv(io.BytesIO(csv.encode()), max_rows=100, chunk_rows=50)
+
+
+def test_csv_error_lines(data):
+    # An unclosed quote on the line 152: rows 101 to 200 of the chunk, lines 102 to 201
+    lines = data.to_csv(index=False).splitlines()
+    lines[151] = 'França,Europa,"1,2,3,2016'
+    with pytest.raises(ValueError, match='próximos às linhas 102 a 201'):
+        read_data_csv(io.BytesIO('\n'.join(lines).encode()), chunk_rows=100)
+
+
+def test_unreadable_files():
+    with pytest.raises(ValueError, match='cabeçalho'):
+        read_data_csv(io.BytesIO(b''))
+    with pytest.raises(ValueError, match='metadados'):
+        read_data_parquet(io.BytesIO(b'PAR1 not a parquet file'))
+
+
+def test_parquet_count_types(data):
+    with pytest.raises(ValueError, match='Total'):
+        read_data_parquet(to_parquet(get_labels(data).assign(Total=pd.Timestamp('2020-01-01'))))
+    # Text counts (e.g. '-') are kept for the validation of the data
+    text = read_data_parquet(to_parquet(get_labels(data).astype({'Total': str})))
+    assert text['Total'].tolist() == data['Total'].astype(str).tolist()
+
+
+def test_read_data_file(data):
+    csv = to_csv(get_labels(data))
+    csv.name = 'dados.csv'
+    parquet = to_parquet(get_labels(data))
+    parquet.name = 'dados.parquet'
+    pd.testing.assert_frame_equal(read_data_file(csv), read_data_file(parquet), check_dtype=False)
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+
+from datario import validate_data, combine_reports
+
+COORDINATES = pd.DataFrame({'lat': [46.0, -35.0], 'lon': [2.0, -71.0]}, index=['França', 'Chile'])
+
+
+def make_raw(rows):
+    return pd.DataFrame(rows, columns=['País', 'Continente', 'Aérea', 'Marítima', 'Total', 'Ano'])
+
+
+def get_lines(report):
+    return report['checks'].set_index('Verificação')['Linhas'].to_dict()
+
+
+def test_valid_data_is_kept():
+    data, report = validate_data(make_raw([
+        ['França', 'Europa', 10, 2, 12, 2016],
+        ['Chile', 'América do Sul', 3, 0, 3, 2017],
+    ]), COORDINATES)
+    assert report['rows'] == 2 and report['removed'] == 0
+    assert not any(get_lines(report).values())
+    assert data['Ano'].astype(str).tolist() == ['2016', '2017']
+    assert data['Total'].tolist() == [12, 3]
+
+
+def test_labels_and_periods():
+    data, report = validate_data(make_raw([
+        [' França ', 'Europa', 1, 0, 1, '2016-01'],
+        ['', 'Europa', 1, 0, 1, '2016'],
+        ['Chile', None, 1, 0, 1, '2016'],
+        ['Chile', 'América do Sul', 1, 0, 1, '2016-13'],
+        ['Chile', 'América do Sul', 1, 0, 1, '16'],
+    ]), COORDINATES)
+    lines = get_lines(report)
+    assert lines['País ausente'] == 1
+    assert lines['Continente ausente'] == 1
+    # Months are periods, other formats are only reported
+    assert lines['Período fora do formato AAAA ou AAAA-MM'] == 2
+    assert report['removed'] == 2
+    assert data['País'].astype(str).tolist() == ['França', 'Chile', 'Chile']
+    assert data['Ano'].astype(str).tolist() == ['2016-01', '2016-13', '16']
+
+
+def test_counts():
+    data, report = validate_data(make_raw([
+        ['França', 'Europa', '10', '-', '10', '2016'],
+        ['França', 'Europa', 'x', '1', '1', '2017'],
+        ['França', 'Europa', '1.5', '1', '2', '2018'],
+        ['Chile', 'América do Sul', '-1', '1', '0', '2016'],
+        ['Chile', 'América do Sul', '2', '1', '5', '2017'],
+    ]), COORDINATES)
+    lines = get_lines(report)
+    assert lines['Contagem com "-" (considerada 0)'] == 1
+    assert lines['Contagem não numérica'] == 2
+    assert lines['Contagem negativa'] == 1
+    assert lines['Total diferente de Aérea + Marítima'] == 1
+    assert report['removed'] == 3
+    assert data[['Aérea', 'Marítima', 'Total']].values.tolist() == [[10, 0, 10], [2, 1, 3]]
+    assert pd.api.types.is_unsigned_integer_dtype(data['Total'].dtype)
+
+
+def test_repeated_keys_and_unknown_countries_are_kept():
+    data, report = validate_data(make_raw([
+        ['França', 'Europa', 1, 0, 1, 2016],
+        ['França', 'Europa', 2, 0, 2, 2016],
+        ['Atlântida', 'Europa', 1, 0, 1, 2016],
+    ]), COORDINATES)
+    lines = get_lines(report)
+    assert lines['Chave (País, Ano) repetida'] == 1
+    assert lines['País sem coordenadas (fora do globo)'] == 1
+    assert report['removed'] == 0 and len(data) == 3
+
+
+def test_only_invalid_rows():
+    with pytest.raises(ValueError):
+        validate_data(make_raw([['', 'Europa', 1, 0, 1, 2016]]), COORDINATES)
+
+
+def test_combine_reports():
+    _, report = validate_data(make_raw([
+        ['França', 'Europa', 1, 0, 2, 2016], ['', 'Europa', 1, 0, 1, 2016]]), COORDINATES)
+    _, other = validate_data(make_raw([['Chile', 'América do Sul', 1, 0, 2, 2017]]), COORDINATES)
+    combined = combine_reports(report, other)
+    assert combined['rows'] == 3 and combined['removed'] == 1
+    assert get_lines(combined)['Total diferente de Aérea + Marítima'] == 2
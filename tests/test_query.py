@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+
+from datario import build_cube, apply_filters, get_available_backends, create_backend
+from conftest import get_filter_combinations
+
+
+@pytest.mark.parametrize('name', get_available_backends())
+def test_backend_matches_pandas_filters(data, name):
+    # The optional backends must return exactly the frames of apply_filters
+    cube = build_cube(data)
+    backend = create_backend(name, data, cube)
+    for continent, country, years in get_filter_combinations(data):
+        pd.testing.assert_frame_equal(
+            backend.filter_rows(continent, country, years),
+            apply_filters(data, continent, country, years))
+        pd.testing.assert_frame_equal(
+            backend.filter_cube(continent, country, years),
+            apply_filters(cube, continent, country, years))
+
+
+def test_unknown_backend(data):
+    with pytest.raises(ValueError):
+        create_backend('spark', data, build_cube(data))
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from datario import SummaryIndex, build_cube, apply_filters, summarize, append_rows, append_cube
+from conftest import make_data, get_filter_combinations
+
+
+def assert_same_summary(summary, expected):
+    assert summary['total'] == expected['total']
+    assert summary['average'] == pytest.approx(expected['average'])
+    # Same countries in the same order, ties included, and the same sums
+    pd.testing.assert_frame_equal(
+        summary['most_tourists'], expected['most_tourists'], check_dtype=False,
+        check_index_type=False)
+
+
+def test_query_matches_summarize(data):
+    cube = build_cube(data)
+    index = SummaryIndex(cube)
+    for continent, country, years in get_filter_combinations(data):
+        assert_same_summary(
+            index.query(continent, country, years),
+            summarize(apply_filters(cube, continent, country, years)))
+
+
+def test_append_matches_rebuilt_index():
+    history = make_data(years=['2015', '2016', '2017'], seed=1)
+    delta = make_data(rows=150, years=['2018', '2019'], seed=2)
+    cube = build_cube(history)
+    data, delta = append_rows(history, delta)
+    delta_cube = build_cube(delta)
+    merged_cube = append_cube(cube, delta_cube)
+    index = SummaryIndex(cube).append(merged_cube, delta_cube)
+
+    full_cube = build_cube(data)
+    for continent, country, years in get_filter_combinations(data):
+        assert_same_summary(
+            index.query(continent, country, years),
+            summarize(apply_filters(full_cube, continent, country, years)))